@@ -0,0 +1,146 @@
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from utils.local_model import LocalHeadingModel
+from utils.layout_utils import LayoutExtractor
+from utils.postprocess import PostProcessor
+from utils.pipeline import process_pdfs_prefetched
+from utils.io_pipeline import BackgroundWriter, OutputWriter, read_file
+
+# Serial batch runner on simulated slow storage: every PDF read and output
+# write waits a fixed per-operation latency plus size / bandwidth, with reads
+# and writes sharing one device. Compares reading and writing inline against
+# prefetching and the background writer, and reports wall time, CPU time,
+# CPU utilisation (CPU / wall) and throughput. Both runs must produce the
+# same files.
+
+
+class SlowStorage:
+    """Stand-in for a network or throttled volume: one operation at a time, each latency + size / bandwidth."""
+
+    def __init__(self, latency_ms: float, mb_per_s: float):
+        self.latency = latency_ms / 1000
+        self.bytes_per_second = mb_per_s * 1024 * 1024
+        self._lock = threading.Lock()
+
+    def wait(self, size: int):
+        with self._lock:
+            time.sleep(self.latency + size / self.bytes_per_second)
+
+    def read(self, path: str) -> bytes:
+        data = read_file(path)
+        self.wait(len(data))
+        return data
+
+
+class _SlowWrites:
+    storage: SlowStorage
+
+    def _write(self, path: str, text: str):
+        self.storage.wait(len(text.encode('utf-8')))
+        super()._write(path, text)
+
+
+class SlowWriter(_SlowWrites, OutputWriter):
+    pass
+
+
+class SlowBackgroundWriter(_SlowWrites, BackgroundWriter):
+    pass
+
+
+def run(pdf_paths, local_model, out_dir, storage, pipelined, args):
+    writer = (SlowBackgroundWriter(args.compact_json, args.write_queue) if pipelined
+              else SlowWriter(args.compact_json))
+    writer.storage = storage
+    layout_extractor = LayoutExtractor(writer=writer)
+    post_processor = PostProcessor(output_dir=os.path.join(out_dir, 'output'), writer=writer)
+    reports = []
+    wall, cpu = time.perf_counter(), time.process_time()
+    for _, group_reports in process_pdfs_prefetched(pdf_paths, local_model, layout_extractor, post_processor,
+                                                    os.path.join(out_dir, 'layout'), batch_size=args.batch_size,
+                                                    prefetch=args.prefetch if pipelined else 0,
+                                                    reader=storage.read):
+        reports.extend(group_reports)
+    failed = writer.close()
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    return {
+        'mode': 'pipelined' if pipelined else 'sync',
+        'documents': len(reports),
+        'errors': sum(1 for r in reports if r['path'] == 'error') + len(failed),
+        'wall_seconds': wall,
+        'cpu_seconds': cpu,
+        'utilisation': cpu / wall,
+        'docs_per_second': len(reports) / wall,
+    }
+
+
+def read_tree(root):
+    files = {}
+    for path in glob.glob(os.path.join(root, '**', '*.json'), recursive=True):
+        with open(path, 'rb') as f:
+            files[os.path.relpath(path, root)] = f.read()
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prefetching and background writes on slow storage.")
+    parser.add_argument("pdfs", nargs="*", help="PDFs to process (default: input/*.pdf)")
+    parser.add_argument("--copies", type=int, default=20, help="Times each PDF is repeated (default: 20)")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Latency per read or write (default: 5)")
+    parser.add_argument("--mb-per-s", type=float, default=50.0, help="Storage bandwidth in MB/s (default: 50)")
+    parser.add_argument("--prefetch", type=int, default=1,
+                        help="Groups read ahead in the pipelined run (default: 1)")
+    parser.add_argument("--write-queue", type=int, default=32, help="Background writer queue size (default: 32)")
+    parser.add_argument("--batch-size", type=int, default=8, help="Documents per model call (default: 8)")
+    parser.add_argument("--compact-json", action="store_true", help="Write JSON without indentation")
+    parser.add_argument("--json", default=None, help="Also write the results to this file")
+    args = parser.parse_args()
+
+    sources = args.pdfs or sorted(glob.glob('input/*.pdf'))
+    if not sources:
+        print("No PDFs to process.")
+        return 1
+    local_model = LocalHeadingModel()
+    if not local_model.load_model():
+        print("Error: Failed to load the local model.")
+        return 1
+
+    storage = SlowStorage(args.latency_ms, args.mb_per_s)
+    results, trees = [], []
+    with tempfile.TemporaryDirectory(prefix='bench-io-') as tmp:
+        input_dir = os.path.join(tmp, 'input')
+        os.makedirs(input_dir)
+        pdf_paths = []
+        for copy in range(args.copies):
+            for source in sources:
+                name = f"{os.path.splitext(os.path.basename(source))[0]}-{copy}.pdf"
+                pdf_paths.append(shutil.copyfile(source, os.path.join(input_dir, name)))
+        for pipelined in (False, True):
+            out_dir = os.path.join(tmp, 'pipelined' if pipelined else 'sync')
+            results.append(run(pdf_paths, local_model, out_dir, storage, pipelined, args))
+            trees.append(read_tree(out_dir))
+
+    print(f"\n{len(pdf_paths)} documents, {args.latency_ms:g} ms + {args.mb_per_s:g} MB/s per I/O operation")
+    print(f"{'mode':>10} {'errors':>6} {'wall s':>8} {'cpu s':>8} {'util':>6} {'docs/s':>8}")
+    for r in results:
+        print(f"{r['mode']:>10} {r['errors']:>6} {r['wall_seconds']:>8.2f} {r['cpu_seconds']:>8.2f} "
+              f"{r['utilisation']:>6.0%} {r['docs_per_second']:>8.1f}")
+    sync, pipelined = results
+    print(f"Speed-up: {sync['wall_seconds'] / pipelined['wall_seconds']:.2f}x; "
+          f"outputs {'identical' if trees[0] == trees[1] else 'DIFFER'}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0 if trees[0] == trees[1] and not any(r['errors'] for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
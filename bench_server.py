@@ -0,0 +1,91 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+# Load test for serve.py: each concurrency level sends the same set of
+# requests from that many client threads, then reports throughput, latency
+# percentiles and how many requests were turned away with 503.
+
+
+def post_pdf(url: str, name: str, data: bytes):
+    request = urllib.request.Request(f"{url}/outline?name={quote(name)}", data=data,
+                                     headers={'Content-Type': 'application/pdf'})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+    return status, time.perf_counter() - started
+
+
+def percentile(values, q):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def run_level(url, documents, clients, requests):
+    jobs = [documents[i % len(documents)] for i in range(requests)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        results = list(executor.map(lambda doc: post_pdf(url, *doc), jobs))
+    elapsed = time.perf_counter() - started
+    ok = [latency for status, latency in results if status == 200]
+    return {
+        'clients': clients,
+        'requests': requests,
+        'ok': len(ok),
+        'rejected': sum(1 for status, _ in results if status == 503),
+        'failed': sum(1 for status, _ in results if status not in (200, 503)),
+        'seconds': elapsed,
+        'docs_per_second': len(ok) / elapsed,
+        'p50_ms': percentile(ok, 0.50) * 1000,
+        'p95_ms': percentile(ok, 0.95) * 1000,
+        'max_ms': max(ok) * 1000 if ok else float('nan'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark serve.py with concurrent clients.")
+    parser.add_argument("pdfs", nargs="*", help="PDFs to send (default: input/*.pdf)")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--clients", default="1,2,4,8", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per concurrency level")
+    parser.add_argument("--json", default=None, help="Also write the results to this file")
+    args = parser.parse_args()
+
+    documents = []
+    for path in args.pdfs or sorted(glob.glob('input/*.pdf')):
+        with open(path, 'rb') as f:
+            documents.append((os.path.splitext(os.path.basename(path))[0], f.read()))
+    if not documents:
+        print("No PDFs to send.")
+        return 1
+
+    results = []
+    print(f"{'clients':>7} {'ok':>5} {'503':>5} {'failed':>6} {'docs/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for clients in (int(c) for c in args.clients.split(',')):
+        r = run_level(args.url, documents, clients, args.requests)
+        results.append(r)
+        print(f"{r['clients']:>7} {r['ok']:>5} {r['rejected']:>5} {r['failed']:>6} {r['docs_per_second']:>8.1f} "
+              f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['max_ms']:>8.1f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,234 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Per-stage benchmark of the pipeline on the bundled PDFs plus synthetic
+# documents of 10 to 10,000 pages. Each document runs in a fresh process so
+# its peak RSS is not inflated by earlier ones. Results are written as JSON;
+# --compare checks them against a stored run and exits with status 1 when a
+# stage got slower (or bigger) than the threshold allows.
+
+STAGES = ('extract', 'features', 'predict', 'postprocess')
+DEFAULT_SIZES = '10,100,1000,10000'
+# Part of the generated file names; bump when make_synthetic_pdf changes
+SYNTHETIC_VERSION = 1
+
+BODY_LINE = "Line {line} of section {section} carries enough ordinary words to read as running body text."
+
+
+def make_synthetic_pdf(path: str, pages: int):
+    """Deterministic report-like PDF: a title page, one numbered H1 per page, an H2 every
+    other page and 24 lines of body text, so every stage sees realistic block counts."""
+    import fitz
+    doc = fitz.open()
+    for p in range(pages):
+        page = doc.new_page()
+        # One Shape per page: committing every line separately dominates generation time
+        shape = page.new_shape()
+        y = 72
+        if p == 0:
+            shape.insert_text((72, y), "Synthetic Benchmark Report", fontsize=24, fontname="hebo")
+            y += 40
+        shape.insert_text((72, y), f"{p + 1}. Section {p + 1} Overview", fontsize=16, fontname="hebo")
+        y += 28
+        for line in range(24):
+            if line == 12 and p % 2 == 0:
+                shape.insert_text((72, y + 6), f"{p + 1}.1 Details of Section {p + 1}", fontsize=13, fontname="hebo")
+                y += 26
+            shape.insert_text((72, y), BODY_LINE.format(line=line + 1, section=p + 1), fontsize=10)
+            y += 24
+        shape.insert_text((290, 812), str(p + 1), fontsize=9)
+        shape.commit()
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+
+
+class RSSSampler:
+    """Peak resident set size over a with-block, sampled from /proc in a background thread.
+
+    Where /proc/self/statm is missing, falls back to the process-lifetime peak from getrusage.
+    """
+
+    def __init__(self, interval: float = 0.002):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def current_bytes() -> int:
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError):
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == 'darwin' else peak * 1024
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_bytes = max(self.peak_bytes, self.current_bytes())
+
+    def __enter__(self):
+        self.peak_bytes = self.current_bytes()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_bytes = max(self.peak_bytes, self.current_bytes())
+
+
+def _bench_document(pdf_path: str, model_dir: str, repeat: int) -> dict:
+    """Runs in a fresh worker process: every stage `repeat` times, keeping the fastest time."""
+    import logging
+    import fitz
+    logging.disable(logging.WARNING)
+    from utils.feature_extractor import FeatureExtractor
+    from utils.layout_utils import LayoutExtractor
+    from utils.local_model import LocalHeadingModel
+    from utils.postprocess import PostProcessor
+
+    model = LocalHeadingModel(model_dir=model_dir)
+    if not model.load_model():
+        raise RuntimeError(f"Failed to load the model from '{model_dir}'")
+    layout_extractor = LayoutExtractor()
+    feature_extractor = FeatureExtractor()
+    post_processor = PostProcessor()
+    with fitz.open(pdf_path) as doc:
+        pages = doc.page_count
+    pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
+
+    seconds = {stage: float('inf') for stage in STAGES}
+    peak = {stage: 0 for stage in STAGES}
+
+    def timed(stage, fn, *args):
+        with RSSSampler() as rss:
+            started = time.perf_counter()
+            result = fn(*args)
+            seconds[stage] = min(seconds[stage], time.perf_counter() - started)
+        peak[stage] = max(peak[stage], rss.peak_bytes)
+        return result
+
+    for _ in range(repeat):
+        blocks = timed('extract', layout_extractor.extract_layout, pdf_path)
+        features = timed('features', feature_extractor.extract_features, blocks)
+        labels = timed('predict', model.predict_from_features, features) if len(blocks) else []
+        timed('postprocess', post_processor.build_output, blocks, labels, pdf_name)
+
+    stages = {}
+    for stage in STAGES:
+        if seconds[stage] == float('inf'):
+            # Never ran (no text blocks to classify): zeros keep the results valid JSON and comparable
+            seconds[stage] = 0.0
+            stages[stage] = {'seconds': 0.0, 'pages_per_second': 0.0, 'blocks_per_second': 0.0, 'peak_rss_mb': 0.0}
+            continue
+        s = max(seconds[stage], 1e-9)
+        stages[stage] = {'seconds': seconds[stage], 'pages_per_second': pages / s,
+                         'blocks_per_second': len(blocks) / s, 'peak_rss_mb': peak[stage] / 2 ** 20}
+    total = sum(seconds.values())
+    s = max(total, 1e-9)
+    stages['total'] = {'seconds': total, 'pages_per_second': pages / s, 'blocks_per_second': len(blocks) / s,
+                       'peak_rss_mb': max(peak.values()) / 2 ** 20}
+    return {'document': os.path.basename(pdf_path), 'pages': pages, 'blocks': len(blocks), 'stages': stages}
+
+
+def compare(current: dict, baseline: dict, threshold: float, rss_threshold: float, min_seconds: float) -> list:
+    """(document, stage, metric, baseline, current) for every regression past the thresholds."""
+    baseline_docs = {r['document']: r for r in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        base = baseline_docs.get(result['document'])
+        if base is None:
+            continue
+        for stage, now in result['stages'].items():
+            was = base['stages'].get(stage)
+            if was is None:
+                continue
+            # Stages that take a few milliseconds are all noise; min_seconds ignores them
+            if now['seconds'] > was['seconds'] * (1 + threshold) and now['seconds'] - was['seconds'] > min_seconds:
+                regressions.append((result['document'], stage, 'seconds', was['seconds'], now['seconds']))
+            if now['peak_rss_mb'] > was['peak_rss_mb'] * (1 + rss_threshold):
+                regressions.append((result['document'], stage, 'peak_rss_mb', was['peak_rss_mb'], now['peak_rss_mb']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark each pipeline stage on bundled and synthetic PDFs.")
+    parser.add_argument("pdfs", nargs="*", help="PDFs to benchmark (default: input/*.pdf)")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help=f"Synthetic document page counts, comma-separated ('' for none, default: {DEFAULT_SIZES})")
+    parser.add_argument("--synthetic-dir", default=os.path.join(tempfile.gettempdir(), "heading-bench"),
+                        help="Where generated PDFs are kept between runs")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per document; the fastest is kept")
+    parser.add_argument("--model-dir", default="model")
+    parser.add_argument("--output", default="benchmark.json", help="Results file (default: benchmark.json)")
+    parser.add_argument("--compare", default=None, help="Baseline results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.20,
+                        help="Allowed slow-down per stage before it counts as a regression (default: 0.20)")
+    parser.add_argument("--rss-threshold", type=float, default=0.25,
+                        help="Allowed peak RSS growth per stage (default: 0.25)")
+    parser.add_argument("--min-seconds", type=float, default=0.01,
+                        help="Ignore slow-downs smaller than this many seconds (default: 0.01)")
+    args = parser.parse_args()
+
+    pdf_paths = args.pdfs or sorted(glob.glob('input/*.pdf'))
+    sizes = [int(n) for n in args.sizes.split(',') if n.strip()]
+    if sizes:
+        os.makedirs(args.synthetic_dir, exist_ok=True)
+    for pages in sizes:
+        path = os.path.join(args.synthetic_dir, f"synthetic_v{SYNTHETIC_VERSION}_{pages}.pdf")
+        if not os.path.exists(path):
+            print(f"Generating {pages}-page synthetic PDF...")
+            make_synthetic_pdf(path, pages)
+        pdf_paths.append(path)
+
+    results = []
+    print(f"{'document':<24} {'pages':>6} {'blocks':>7} {'stage':<12} {'seconds':>9} {'pages/s':>10} "
+          f"{'blocks/s':>11} {'peak MB':>8}")
+    for pdf_path in pdf_paths:
+        # A fresh process per document keeps peak RSS figures independent
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            result = executor.submit(_bench_document, pdf_path, args.model_dir, max(1, args.repeat)).result()
+        results.append(result)
+        for stage, m in result['stages'].items():
+            print(f"{result['document'][-24:]:<24} {result['pages']:>6} {result['blocks']:>7} {stage:<12} "
+                  f"{m['seconds']:>9.4f} {m['pages_per_second']:>10.1f} {m['blocks_per_second']:>11.0f} "
+                  f"{m['peak_rss_mb']:>8.1f}")
+
+    import fitz
+    import numpy as np
+    current = {
+        'meta': {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                 'numpy': np.__version__, 'pymupdf': fitz.VersionBind, 'platform': platform.platform(),
+                 'cpu_count': os.cpu_count(), 'repeat': args.repeat},
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(current, f, indent=2, allow_nan=False)
+    print(f"\nResults saved to: {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold, args.rss_threshold, args.min_seconds)
+        for document, stage, metric, was, now in regressions:
+            change = f"{now / was - 1:+.0%}" if was else "newly run"
+            print(f"REGRESSION {document} {stage} {metric}: {was:.4f} -> {now:.4f} ({change})")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.compare}.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,47 @@
+import glob
+import sys
+import numpy as np
+from utils.layout_utils import LayoutExtractor
+from utils.feature_extractor import FeatureExtractor
+
+# Checks that the columnar FeatureExtractor.extract_features is bit-identical to
+# the row-by-row reference on the bundled PDFs and on hand-made edge cases.
+
+EDGE_CASES = {
+    'single block': [{'text': 'Only', 'font_size': 12, 'bbox': {'y1': 5}, 'line_position': 1, 'page_number': 1}],
+    'uniform font size': [{'text': 'A', 'font_size': 10, 'page_number': 1}, {'text': 'B', 'font_size': 10, 'page_number': 1}],
+    'missing keys': [{}, {'text': '1.2 Scope:'}, {'bbox': {}}, {'line_position': 3}, {'bbox': {'y1': 7.5}, 'page_number': 2}],
+    'page breaks': [
+        {'text': 'INTRODUCTION TO TESTING', 'font_size': 16, 'is_bold': True, 'page_number': 1,
+         'line_position': 40, 'bbox': {'y1': 60}, 'relative_x': 0.4, 'relative_y': 0.05},
+        {'text': '1. Scope', 'font_size': 12.5, 'page_number': 1, 'line_position': 90, 'bbox': {'y1': 100}},
+        {'text': 'Body text ' * 20, 'font_size': 10, 'page_number': 2, 'line_position': 30,
+         'bbox': {'y1': 80}, 'source': 'digital_search'},
+        {'text': 'Title Case Heading', 'font_size': 14, 'is_italic': True, 'page_number': 2,
+         'line_position': 120, 'bbox': {'y1': 135}},
+    ],
+}
+
+
+def compare(name, blocks, extractor):
+    fast = extractor.extract_features(blocks)
+    reference = extractor._extract_features_per_block(blocks)
+    same = fast.shape == reference.shape and fast.dtype == reference.dtype and \
+        np.array_equal(fast.view(np.uint64), reference.view(np.uint64))
+    print(f"{'OK  ' if same else 'FAIL'} {name}: {fast.shape[0]} blocks")
+    return same
+
+
+def main():
+    extractor = FeatureExtractor()
+    results = [compare(name, blocks, extractor) for name, blocks in EDGE_CASES.items()]
+    layout_extractor = LayoutExtractor()
+    for pdf_path in sorted(glob.glob('input/*.pdf')):
+        store = layout_extractor.extract_layout(pdf_path)
+        results.append(compare(pdf_path, store, extractor))
+        results.append(compare(f"{pdf_path} (dicts)", store.to_dicts(), extractor))
+    return 0 if all(results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,13 +1,11 @@
-import pandas as pd # type: ignore
-import json
+import sys
+from utils.training_data import count_labels
 
-# Load your training data
-with open('training_data/gemini_training_data.json', 'r', encoding='utf-8') as f:
-    data = json.load(f)
-
-# Use pandas to count the labels
-df = pd.DataFrame(data)
-label_counts = df['label'].value_counts()
+# Counts labels in a training file without loading it into a DataFrame;
+# JSONL files are streamed line by line.
+path = sys.argv[1] if len(sys.argv) > 1 else 'training_data/gemini_training_data.json'
+label_counts = count_labels(path)
 
 print("Label counts in your training data:")
-print(label_counts)
\ No newline at end of file
+for label, count in label_counts.most_common():
+    print(f"{label:<8} {count}")
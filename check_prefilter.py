@@ -0,0 +1,66 @@
+import argparse
+import glob
+import sys
+import time
+import numpy as np
+from utils.layout_utils import LayoutExtractor
+from utils.local_model import LocalHeadingModel
+from utils.prefilter import BodyTextFilter
+
+# Measures how the body-text pre-filter compares with the model: how many
+# blocks it takes off the model, and how many model headings it would lose.
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure pre-filter recall against the heading model.")
+    parser.add_argument("pdfs", nargs="*", help="PDFs to check (default: input/*.pdf)")
+    parser.add_argument("--min-words", type=int, default=10)
+    parser.add_argument("--min-chars", type=int, default=50)
+    parser.add_argument("--max-font-ratio", type=float, default=1.1)
+    parser.add_argument("--min-recall", type=float, default=1.0,
+                        help="Exit with status 1 when overall heading recall falls below this")
+    args = parser.parse_args()
+
+    prefilter = BodyTextFilter(args.min_words, args.min_chars, args.max_font_ratio)
+    model = LocalHeadingModel()
+    if not model.load_model():
+        return 1
+    filtered_model = LocalHeadingModel(prefilter=prefilter)
+    filtered_model.load_model()
+
+    layout_extractor = LayoutExtractor()
+    total_blocks = total_skipped = total_headings = total_missed = 0
+    print(f"{'document':<32} {'blocks':>7} {'skipped':>8} {'headings':>9} {'missed':>7} {'same':>5} {'speed-up':>9}")
+    for pdf_path in args.pdfs or sorted(glob.glob('input/*.pdf')):
+        blocks = layout_extractor.extract_layout(pdf_path)
+        if not blocks:
+            continue
+        started = time.perf_counter()
+        labels = np.array(model.predict(blocks))
+        model_time = time.perf_counter() - started
+        started = time.perf_counter()
+        filtered_labels = np.array(filtered_model.predict(blocks))
+        filtered_time = time.perf_counter() - started
+
+        skipped = prefilter.body_text_mask(blocks)
+        headings = labels != 'NONE'
+        missed = headings & skipped
+        for i in np.flatnonzero(missed):
+            print(f"    missed {labels[i]}: {blocks.texts[i][:70]!r}")
+
+        total_blocks += len(blocks)
+        total_skipped += int(skipped.sum())
+        total_headings += int(headings.sum())
+        total_missed += int(missed.sum())
+        same = 'yes' if np.array_equal(labels[~skipped], filtered_labels[~skipped]) else 'NO'
+        print(f"{pdf_path[-32:]:<32} {len(blocks):>7} {skipped.mean():>8.1%} {int(headings.sum()):>9} "
+              f"{int(missed.sum()):>7} {same:>5} {model_time / max(filtered_time, 1e-9):>8.1f}x")
+
+    recall = 1.0 - total_missed / total_headings if total_headings else 1.0
+    print(f"\nBlocks skipped: {total_skipped}/{total_blocks} ({total_skipped / max(total_blocks, 1):.1%})")
+    print(f"Heading recall vs model: {recall:.4f} ({total_missed} of {total_headings} headings lost)")
+    return 0 if recall >= args.min_recall else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,23 @@
+import argparse
+import sys
+from utils.local_model import LocalHeadingModel
+
+# Packs the trained joblib model into the single-file runtime artifact that
+# main.py loads without importing xgboost or scikit-learn.
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the trained heading model for fast inference.")
+    parser.add_argument("--model-dir", default="model")
+    parser.add_argument("--output", default=None, help="Artifact path (default: <model-dir>/heading_model.bin)")
+    args = parser.parse_args()
+
+    model = LocalHeadingModel(model_dir=args.model_dir)
+    if not model.load_model(use_runtime=False):
+        return 1
+    print(f"Exported runtime model to {model.export_runtime(args.output)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
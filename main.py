@@ -1,21 +1,27 @@
-# main.py
 import os
 import glob
+import json
+import argparse
 from utils.local_model import LocalHeadingModel
 from utils.layout_utils import LayoutExtractor
 from utils.postprocess import PostProcessor
-
-
-def run_phase3_process_new_pdfs():
+from utils.prefilter import BodyTextFilter
+from utils.outline import OutlineExtractor
+from utils.pipeline import process_pdfs_prefetched, process_pdf_streaming, process_pdfs_parallel
+from utils.io_pipeline import BackgroundWriter, OutputWriter
+from utils.watcher import FolderWatcher
+from utils import metrics
+
+
+def run_phase3_process_new_pdfs(workers: int = 1, use_cache: bool = True, cache_max_mb: int = 512,
+                                dump_layout: bool = True, batch_size: int = 16, prefilter: bool = False,
+                                use_outline: bool = False, report_path: str = None, watch: bool = False,
+                                poll_interval: float = 2.0, stream_pages: int = 0, shard_workers: int = 1,
+                                metrics_jsonl: str = None, metrics_prom: str = None,
+                                latency_budget_us: float = None, page_cache: bool = False, prefetch: int = 1,
+                                write_queue: int = 32, compact_json: bool = False, use_xgboost: bool = False):
     print("\n--- Starting Phase 3: Processing New PDFs with Local Model ---")
 
-    # Load the trained model
-    local_model = LocalHeadingModel()
-    if not local_model.load_model():
-        print("Error: Failed to load the local model.")
-        print("Please run Phase 2 to train the model first.")
-        return
-
     # Updated paths to match Docker volume mounts
     input_dir = "/app/input"
     output_dir = "/app/output"
@@ -25,6 +31,23 @@ def run_phase3_process_new_pdfs():
     os.makedirs(output_dir, exist_ok=True)
     os.makedirs(layout_dir, exist_ok=True)
 
+    # Cached layouts live under layout_dir/cache, keyed by PDF content and extractor version
+    extractor_options = {'use_cache': use_cache, 'cache_max_bytes': cache_max_mb * 1024 * 1024,
+                         'dump_json': dump_layout, 'shard_workers': shard_workers, 'page_cache': page_cache}
+    model_options = {'prefilter': BodyTextFilter() if prefilter else None, 'latency_budget_us': latency_budget_us,
+                     'use_runtime': not use_xgboost}
+    reports = []
+    # Per-stage timers and counters are only collected when something will export them
+    metrics_sink = None
+    if metrics_jsonl or metrics_prom:
+        metrics.enable()
+        metrics_sink = metrics.MetricsSink(metrics_jsonl, metrics_prom)
+
+    if watch:
+        run_watch_mode(input_dir, output_dir, layout_dir, extractor_options, model_options, use_outline,
+                       batch_size, poll_interval, metrics_sink, compact_json)
+        return
+
     # Find PDFs
     input_pdf = glob.glob(os.path.join(input_dir, "*.pdf"))
     if not input_pdf:
@@ -33,34 +56,189 @@ def run_phase3_process_new_pdfs():
 
     print(f"Found {len(input_pdf)} PDFs to process.")
 
-    layout_extractor = LayoutExtractor()
-    post_processor = PostProcessor(output_dir=output_dir)
+    if workers > 1:
+        # Each worker process loads its own copy of the model once
+        print(f"Processing with {workers} worker processes.")
+        for pdf_path, report, error in process_pdfs_parallel(input_pdf, output_dir, layout_dir, workers,
+                                                                extractor_options=extractor_options,
+                                                                model_options=model_options,
+                                                                outline_options={} if use_outline else None,
+                                                                stream_pages=stream_pages,
+                                                                compact_json=compact_json):
+            if error is not None:
+                print(f"[ERROR] Failed to process {os.path.basename(pdf_path)}: {error}")
+                reports.append({'pdf': os.path.basename(pdf_path), 'path': 'error', 'output': None,
+                                'error': str(error)})
+                continue
+            reports.append(report)
+            if report['output']:
+                print(f"Processed {report['pdf']} ({report['path']}). Results saved to: {report['output']}")
+        _write_reports(reports, report_path, metrics_sink)
+        print("\n--- Phase 3 Complete ---")
+        return
 
-    for pdf_path in input_pdf:
-        print(f"\nProcessing: {os.path.basename(pdf_path)}...")
+    # Load the trained model
+    local_model = LocalHeadingModel(**model_options)
+    if not local_model.load_model():
+        print("Error: Failed to load the local model.")
+        print("Please run Phase 2 to train the model first.")
+        return
 
-        blocks = layout_extractor.extract_and_save_layout(pdf_path, layout_dir)
-        if not blocks:
-            print(f"Could not extract any text blocks from {pdf_path}. Skipping.")
-            continue
+    # Outputs are serialised and written on a background thread while the next documents are processed
+    writer = BackgroundWriter(compact_json, write_queue) if write_queue > 0 else OutputWriter(compact_json)
+    layout_extractor = LayoutExtractor(writer=writer, **extractor_options)
+    post_processor = PostProcessor(output_dir=output_dir, writer=writer)
+    outline_extractor = OutlineExtractor() if use_outline else None
+
+    if stream_pages:
+        # Very large PDFs: one document at a time, stream_pages pages in memory at once
+        try:
+            for pdf_path in input_pdf:
+                print(f"\nProcessing: {os.path.basename(pdf_path)}...")
+                try:
+                    report = process_pdf_streaming(pdf_path, local_model, layout_extractor, post_processor,
+                                                   stream_pages, outline_extractor)
+                except Exception as e:
+                    print(f"[ERROR] Failed to process {os.path.basename(pdf_path)}: {e}")
+                    reports.append({'pdf': os.path.basename(pdf_path), 'path': 'error', 'output': None,
+                                    'error': str(e)})
+                    continue
+                reports.append(report)
+                if report['output']:
+                    print(f"Successfully processed {report['pdf']} ({report['path']}). "
+                          f"Results saved to: {report['output']}")
+        finally:
+            _finish_writes(writer, reports)
+        _write_reports(reports, report_path, metrics_sink)
+        print("\n--- Phase 3 Complete ---")
+        return
 
-        predictions = local_model.predict(blocks)
-        pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
-        final_output = post_processor.process_predictions(blocks, predictions, pdf_name)
+    # Small documents are classified together so per-call model overhead is paid once per group;
+    # the next PDFs are read while a group is processed
+    # The writer thread is a daemon: on an exception or Ctrl-C, queued outputs are still written first
+    try:
+        for group, group_reports in process_pdfs_prefetched(input_pdf, local_model, layout_extractor, post_processor,
+                                                            layout_dir, outline_extractor, batch_size, prefetch):
+            print(f"\nProcessed: {', '.join(os.path.basename(p) for p in group)}")
+            reports.extend(group_reports)
+            for report in group_reports:
+                if report['output']:
+                    print(f"Successfully processed {report['pdf']} ({report['path']}). "
+                          f"Results saved to: {report['output']}")
+    finally:
+        _finish_writes(writer, reports)
+    _write_reports(reports, report_path, metrics_sink)
+    print("\n--- Phase 3 Complete ---")
 
-        output_path = os.path.join(output_dir, f"{pdf_name}.json")
-        print(f"Successfully processed. Results saved to: {output_path}")
 
-    print("\n--- Phase 3 Complete ---")
+def run_watch_mode(input_dir, output_dir, layout_dir, extractor_options, model_options, use_outline,
+                   batch_size, poll_interval, metrics_sink=None, compact_json=False):
+    """Keeps the model loaded and processes PDFs as they appear or change in input_dir."""
+    local_model = LocalHeadingModel(**model_options)
+    if not local_model.load_model():
+        print("Error: Failed to load the local model.")
+        return
+    # Synchronous writes: the manifest records an output only once it is on disk
+    writer = OutputWriter(compact_json)
+    watcher = FolderWatcher(input_dir, local_model, LayoutExtractor(writer=writer, **extractor_options),
+                            PostProcessor(output_dir=output_dir, writer=writer), layout_dir,
+                            outline_extractor=OutlineExtractor() if use_outline else None,
+                            poll_interval=poll_interval, batch_size=batch_size, metrics_sink=metrics_sink)
+    watcher.run()
+
+
+def _finish_writes(writer, reports):
+    """Waits for queued output writes; documents whose output could not be written become errors."""
+    failed = dict(writer.close())
+    for report in reports:
+        if report['output'] in failed:
+            print(f"[ERROR] Failed to write {report['output']}: {failed[report['output']]}")
+            report.update(path='error', output=None, error=str(failed[report['output']]))
+
+
+def _write_reports(reports, report_path, metrics_sink=None):
+    """Per-document record of which path produced the output (outline, model, skipped or error)."""
+    if metrics_sink is not None:
+        metrics_sink.add_all(reports)
+    if not report_path:
+        return
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(reports, f, indent=2)
+    print(f"Processing report saved to: {report_path}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Extract headings from the PDFs in /app/input.")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("PDF_WORKERS", 1)),
+                        help="Worker processes for batch mode (0 = one per CPU, default: 1)")
+    parser.add_argument("--batch-size", type=int, default=16,
+                        help="Documents classified per model call in serial mode (default: 16)")
+    parser.add_argument("--prefilter", action="store_true",
+                        help="Label long, plain, body-size blocks NONE without running the model "
+                             "(see check_prefilter.py)")
+    parser.add_argument("--outline", action="store_true",
+                        help="Use the PDF's embedded outline (bookmarks) when it passes a quality check, "
+                             "skipping layout extraction and the model")
+    parser.add_argument("--report", default=None,
+                        help="Write a JSON report of which path each document took to this file")
+    parser.add_argument("--stream-pages", type=int, default=0,
+                        help="Process each PDF in windows of this many pages so memory stays flat on very "
+                             "large documents (0 = whole document at once, default)")
+    parser.add_argument("--shard-workers", type=int, default=1,
+                        help="Processes that extract page ranges of one large PDF (100+ pages per range) "
+                             "in parallel (0 = one per CPU, default: 1)")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and process PDFs as they are added or changed; "
+                             "up-to-date files are skipped using output/.manifest.json")
+    parser.add_argument("--poll-interval", type=float, default=2.0,
+                        help="Seconds between input directory scans in --watch mode (default: 2)")
+    parser.add_argument("--metrics-jsonl", default=None,
+                        help="Append per-document stage timings and counters to this JSON lines file")
+    parser.add_argument("--metrics-prom", default=None,
+                        help="Write cumulative metrics to this file in Prometheus text format")
+    parser.add_argument("--latency-budget-us", type=float, default=None,
+                        help="Load the most accurate model variant whose measured per-block latency fits this "
+                             "budget in microseconds (see train.py --variants)")
+    parser.add_argument("--xgboost", action="store_true",
+                        help="Predict with the XGBoost model instead of model/heading_model.bin: about 0.8 s slower "
+                             "to start, faster per block on very large batches")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always re-extract layouts instead of reusing cached ones")
+    parser.add_argument("--page-cache", action="store_true",
+                        help="Cache blocks and predictions per page, so a revised PDF only re-extracts and "
+                             "re-classifies the pages that changed (replaces the whole-document layout cache)")
+    parser.add_argument("--cache-max-mb", type=int, default=512,
+                        help="Size limit of the layout cache; least recently used entries are evicted (default: 512)")
+    parser.add_argument("--no-layout-dump", action="store_true",
+                        help="Skip writing the debug layout JSON to the layout_data directory")
+    parser.add_argument("--prefetch", type=int, default=1,
+                        help="Groups of --batch-size PDFs read ahead in the background in serial mode "
+                             "(0 = read each PDF when needed, default: 1)")
+    parser.add_argument("--write-queue", type=int, default=32,
+                        help="Outputs waiting to be written by the background writer before processing blocks "
+                             "(0 = write synchronously, default: 32)")
+    parser.add_argument("--compact-json", action="store_true",
+                        help="Write output and layout JSON without indentation (smaller, faster to write)")
+    return parser.parse_args()
 
 
 if __name__ == '__main__':
     # # Step 1: Generate training data using a few sample PDFs
     # training_file = run_phase1_generate_training_data()
-    
+
     # # Step 2: Train your local model using the generated data.
     # if training_file:
     #      run_phase2_train_local_model(training_file)
 
     # Step 3: Use your trained model to process new documents.
-    run_phase3_process_new_pdfs()
\ No newline at end of file
+    args = parse_args()
+    run_phase3_process_new_pdfs(workers=args.workers or os.cpu_count() or 1, use_cache=not args.no_cache,
+                                cache_max_mb=args.cache_max_mb, dump_layout=not args.no_layout_dump,
+                                batch_size=max(1, args.batch_size), prefilter=args.prefilter,
+                                use_outline=args.outline, report_path=args.report, watch=args.watch,
+                                poll_interval=args.poll_interval, stream_pages=max(0, args.stream_pages),
+                                shard_workers=args.shard_workers or os.cpu_count() or 1,
+                                metrics_jsonl=args.metrics_jsonl, metrics_prom=args.metrics_prom,
+                                latency_budget_us=args.latency_budget_us, page_cache=args.page_cache,
+                                prefetch=max(0, args.prefetch), write_queue=max(0, args.write_queue),
+                                compact_json=args.compact_json, use_xgboost=args.xgboost)
@@ -0,0 +1,125 @@
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import fitz
+from utils.prefilter import BodyTextFilter
+from utils.service import OutlineWorkerPool, PoolBusy
+
+# Local HTTP front end for in-memory processing:
+#   POST /outline?name=<pdf name>   body: PDF bytes  ->  outline JSON
+#   GET  /health                    ->  200, or 503 while a crashed worker pool is rebuilt
+# Requests beyond the pool's capacity get 503 with Retry-After instead of queueing.
+
+
+class OutlineRequestHandler(BaseHTTPRequestHandler):
+    pool: OutlineWorkerPool = None
+    max_bytes = 64 * 1024 * 1024
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/health':
+            return self._send_json(404, {'error': 'not found'})
+        if self.pool.broken:
+            # A worker died and the pool is being (or failed to be) rebuilt
+            return self._send_json(503, {'status': 'broken', 'workers': self.pool.workers}, {'Retry-After': '1'})
+        self._send_json(200, {'status': 'ok', 'workers': self.pool.workers, 'max_pending': self.pool.max_pending})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/outline':
+            return self._send_json(404, {'error': 'not found'})
+        length = self.headers.get('Content-Length')
+        if length is None:
+            return self._send_json(411, {'error': 'Content-Length required'})
+        try:
+            length = int(length)
+            if length < 0:
+                raise ValueError(length)
+        except ValueError:
+            # A negative length would make rfile.read block until the client hangs up
+            return self._send_json(400, {'error': 'Content-Length must be a non-negative integer'})
+        if length > self.max_bytes:
+            return self._send_json(413, {'error': f'PDF larger than {self.max_bytes} bytes'})
+        pdf_bytes = self.rfile.read(length)
+        pdf_name = parse_qs(url.query).get('name', ['document'])[0]
+
+        try:
+            outline = self.pool.process(pdf_bytes, pdf_name)
+        except PoolBusy as e:
+            return self._send_json(503, {'error': str(e)}, {'Retry-After': '1'})
+        except fitz.FileDataError as e:
+            return self._send_json(400, {'error': f'not a readable PDF: {e}'})
+        except Exception as e:
+            self.log_error("Failed to process %s: %s", pdf_name, e)
+            return self._send_json(500, {'error': str(e)})
+        self._send_json(200, outline)
+
+    def _send_json(self, status: int, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve heading extraction over HTTP with a warm model.")
+    parser.add_argument("--host", default="127.0.0.1", help="Use 0.0.0.0 inside a container")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes, each with a loaded model")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="Requests queued or running before new ones get 503 (default: 2 x workers)")
+    parser.add_argument("--max-mb", type=int, default=64, help="Largest accepted PDF (default: 64)")
+    parser.add_argument("--model-dir", default="model")
+    parser.add_argument("--prefilter", action="store_true")
+    parser.add_argument("--outline", action="store_true", help="Use embedded PDF outlines when usable")
+    parser.add_argument("--latency-budget-us", type=float, default=None,
+                        help="Per-block latency budget; picks a model variant (see train.py --variants)")
+    parser.add_argument("--quiet", action="store_true", help="Do not log every request")
+    args = parser.parse_args()
+
+    pool = OutlineWorkerPool(workers=max(1, args.workers), max_pending=args.max_pending, model_dir=args.model_dir,
+                             model_options={'prefilter': BodyTextFilter() if args.prefilter else None,
+                                            'latency_budget_us': args.latency_budget_us},
+                             outline_options={} if args.outline else None)
+    try:
+        pool.warm_up()
+    except Exception as e:
+        print(f"Error: workers failed to start: {e}")
+        pool.close()
+        return 1
+
+    OutlineRequestHandler.pool = pool
+    OutlineRequestHandler.max_bytes = args.max_mb * 1024 * 1024
+    server = ThreadingHTTPServer((args.host, args.port), OutlineRequestHandler)
+    server.daemon_threads = True
+    server.quiet = args.quiet
+
+    # serve_forever() must be stopped from another thread
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"Serving on http://{args.host}:{args.port} with {pool.workers} workers "
+          f"(max {pool.max_pending} pending requests, pid {os.getpid()})")
+    server.serve_forever()
+    server.server_close()
+    pool.close()
+    print("Server stopped.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
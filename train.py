@@ -0,0 +1,64 @@
+import argparse
+import os
+import sys
+from utils.local_model import LocalHeadingModel, VARIANTS_DIR, VARIANTS_REPORT
+
+# Trains the heading classifier from labelled blocks and exports the runtime
+# artifact next to it. Training data is JSONL (one block with a 'label' and,
+# ideally, a 'document' key per line) or the legacy JSON array.
+
+
+def report_variants(model: LocalHeadingModel, args) -> int:
+    variants = model.train_variants(args.training_data, n_jobs=args.jobs, early_stopping_rounds=args.early_stopping,
+                                    feature_cache_dir=args.feature_cache)
+    if not variants:
+        return 1
+    print(f"{'variant':<10} {'trees':>6} {'depth':>6} {'features':>9} {'accuracy':>9} {'heading F1':>11} "
+          f"{'us/block':>9} {'xgb us':>7} {'size KB':>8}")
+    for v in variants:
+        n_features = v['features'] if isinstance(v['features'], int) else len(v['features'])
+        print(f"{v['name']:<10} {v['trees']:>6} {v['max_depth']:>6} {n_features:>9} {v['accuracy']:>9.4f} "
+              f"{v['heading_f1']:>11.4f} {v['us_per_block']:>9.2f} "
+              f"{v.get('xgboost_us_per_block', float('nan')):>7.2f} {v['artifact_bytes'] / 1024:>8.0f}")
+    print(f"\nReport saved to: {os.path.join(args.model_dir, VARIANTS_DIR, VARIANTS_REPORT)}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the heading classifier.")
+    parser.add_argument("training_data", help="Labelled blocks (.jsonl, or a legacy .json array)")
+    parser.add_argument("--model-dir", default="model")
+    parser.add_argument("--jobs", type=int, default=0,
+                        help="Processes for feature extraction and threads for boosting (default: all CPUs)")
+    parser.add_argument("--trees", type=int, default=500, help="Maximum boosting rounds (default: 500)")
+    parser.add_argument("--early-stopping", type=int, default=20,
+                        help="Stop after this many rounds without validation improvement (0 disables, default: 20)")
+    parser.add_argument("--continue", dest="continue_training", action="store_true",
+                        help="Add trees to the existing model in --model-dir instead of starting over")
+    parser.add_argument("--feature-cache", default=None,
+                        help="Feature matrix cache directory (default: <model-dir>/feature_cache)")
+    parser.add_argument("--variants", action="store_true",
+                        help="Train the smaller model variants into <model-dir>/variants and report their "
+                             "latency against accuracy instead of training the main model")
+    args = parser.parse_args()
+
+    model = LocalHeadingModel(model_dir=args.model_dir)
+    if args.variants:
+        return report_variants(model, args)
+    report = model.train_model(args.training_data, n_jobs=args.jobs, n_estimators=args.trees,
+                               early_stopping_rounds=args.early_stopping,
+                               continue_training=args.continue_training, feature_cache_dir=args.feature_cache)
+    if not report:
+        return 1
+    if 'rows' not in report:
+        return 0
+    peak = f"{report['peak_rss_mb']:.0f} MB" if report['peak_rss_mb'] is not None else "n/a"
+    print(f"Trained on {report['rows']} blocks: accuracy {report['accuracy']:.3f}, {report['trees']} trees "
+          f"(best iteration {report['best_iteration']})")
+    print(f"Time: {report['total_seconds']:.1f}s total, {report['feature_seconds']:.1f}s features, "
+          f"{report['fit_seconds']:.1f}s boosting. Peak RSS: {peak}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
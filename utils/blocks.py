@@ -0,0 +1,250 @@
+import sys
+import numpy as np
+from array import array
+from collections.abc import Mapping
+from typing import List, Dict, Any, Iterator, Tuple, Optional, BinaryIO, Union
+
+BLOCK_KEYS = ('text', 'bbox', 'font_size', 'is_bold', 'is_italic', 'page_number', 'line_position', 'width',
+              'height', 'relative_x', 'relative_y', 'page_width', 'page_height', 'source')
+
+FLOAT_COLUMNS = ('x0', 'y0', 'x1', 'y1', 'font_size', 'relative_x', 'relative_y')
+COLUMNS = FLOAT_COLUMNS + ('is_bold', 'is_italic', 'page_number', 'source_code')
+
+# Bump when the on-disk layout of BlockStore.save changes
+STORE_FORMAT_VERSION = 1
+
+
+class BlockStore:
+    """Struct-of-arrays storage for the text blocks of one document.
+
+    One NumPy column per numeric field, a list of interned texts, a small
+    source-name table and one (width, height) entry per page instead of per
+    block. Indexing or iterating yields read-only BlockView mappings with the
+    same keys as the legacy block dicts; to_dicts() materialises real dicts.
+    """
+
+    def __init__(self, texts: List[str], columns: Dict[str, np.ndarray], page_sizes: Dict[int, Tuple[float, float]],
+                 sources: List[str], base_font_size: Optional[float] = None):
+        self.texts = texts
+        self.x0 = columns['x0']
+        self.y0 = columns['y0']
+        self.x1 = columns['x1']
+        self.y1 = columns['y1']
+        self.font_size = columns['font_size']
+        self.relative_x = columns['relative_x']
+        self.relative_y = columns['relative_y']
+        self.is_bold = columns['is_bold']
+        self.is_italic = columns['is_italic']
+        self.page_number = columns['page_number']
+        self.source_code = columns['source_code']
+        self.page_sizes = page_sizes
+        self.sources = sources
+        # Median span font size of the document, when known (set by LayoutExtractor)
+        self.base_font_size = base_font_size
+        # (mean, max, min, std) of the whole document's block font sizes, set when the
+        # store holds only part of a document (streaming windows); features use these
+        self.font_stats = None
+        # Set by LayoutExtractor.extract_layout_paged: where each page came from in the page cache
+        self.cached_pages = None
+        self.pages_reused = 0
+
+    @classmethod
+    def empty(cls) -> 'BlockStore':
+        return BlockStoreBuilder().build()
+
+    @classmethod
+    def from_dicts(cls, blocks: List[Dict[str, Any]]) -> 'BlockStore':
+        builder = BlockStoreBuilder()
+        for b in blocks:
+            bbox = b.get('bbox', {})
+            page_number = b.get('page_number', 0)
+            builder.set_page_size(page_number, b.get('page_width', 0), b.get('page_height', 0))
+            builder.add(b.get('text', ''), bbox.get('x0', 0), bbox.get('y0', b.get('line_position', 0)),
+                        bbox.get('x1', 0), bbox.get('y1', 0), b.get('font_size', 0), bool(b.get('is_bold', False)),
+                        bool(b.get('is_italic', False)), page_number, b.get('relative_x', 0), b.get('relative_y', 0),
+                        b.get('source', 'digital'))
+        return builder.build()
+
+    @classmethod
+    def concat(cls, stores: List['BlockStore']) -> 'BlockStore':
+        """Joins the stores of consecutive page ranges of one document, in order.
+
+        Source codes are remapped to first-appearance order, as BlockStoreBuilder
+        assigns them, so the result equals a store built over the whole range.
+        """
+        if not stores:
+            return cls.empty()
+        sources = []
+        for store in stores:
+            sources += [name for name in store.sources if name not in sources]
+        columns = {name: np.concatenate([getattr(store, name) for store in stores]) for name in COLUMNS[:-1]}
+        columns['source_code'] = np.concatenate([
+            np.array([sources.index(name) for name in store.sources], dtype=np.uint8)[store.source_code]
+            for store in stores]).astype(np.uint8)
+        page_sizes = {}
+        for store in stores:
+            for page, size in store.page_sizes.items():
+                page_sizes.setdefault(page, size)
+        texts = [sys.intern(t) for store in stores for t in store.texts]
+        return cls(texts, columns, page_sizes, sources)
+
+    @property
+    def line_position(self) -> np.ndarray:
+        return self.y0
+
+    @property
+    def width(self) -> np.ndarray:
+        return self.x1 - self.x0
+
+    @property
+    def is_low_fidelity(self) -> np.ndarray:
+        if 'digital_search' not in self.sources:
+            return np.zeros(len(self), dtype=bool)
+        return self.source_code == self.sources.index('digital_search')
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, i: int) -> 'BlockView':
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('block index out of range')
+        return BlockView(self, i)
+
+    def __iter__(self) -> Iterator['BlockView']:
+        return (BlockView(self, i) for i in range(len(self)))
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return [view.to_dict() for view in self]
+
+    def save(self, file: Union[str, BinaryIO]):
+        """Writes the store as an uncompressed .npz: raw columns plus one UTF-8 text blob."""
+        joined = ''.join(self.texts)
+        pages = sorted(self.page_sizes)
+        np.savez(
+            file,
+            format_version=np.array(STORE_FORMAT_VERSION),
+            text_blob=np.frombuffer(joined.encode('utf-8'), dtype=np.uint8),
+            text_ends=np.cumsum([len(t) for t in self.texts], dtype=np.int64),
+            page_numbers=np.array(pages, dtype=np.int32),
+            page_dims=np.array([self.page_sizes[p] for p in pages], dtype=np.float64).reshape(len(pages), 2),
+            sources=np.array(self.sources, dtype=np.str_),
+            base_font_size=np.array(np.nan if self.base_font_size is None else self.base_font_size),
+            **{name: getattr(self, name) for name in COLUMNS}
+        )
+
+    @classmethod
+    def load(cls, file: Union[str, BinaryIO]) -> 'BlockStore':
+        with np.load(file, allow_pickle=False) as data:
+            if int(data['format_version']) != STORE_FORMAT_VERSION:
+                raise ValueError(f"Unsupported block store format {int(data['format_version'])}")
+            joined = data['text_blob'].tobytes().decode('utf-8')
+            ends = data['text_ends'].tolist()
+            starts = [0] + ends[:-1]
+            texts = [sys.intern(joined[a:b]) for a, b in zip(starts, ends)]
+            page_sizes = {p: (w, h) for p, (w, h) in zip(data['page_numbers'].tolist(), data['page_dims'].tolist())}
+            base_font_size = data['base_font_size'].item()
+            return cls(texts, {name: data[name] for name in COLUMNS}, page_sizes, data['sources'].tolist(),
+                       None if np.isnan(base_font_size) else base_font_size)
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the store (columns plus text payload)."""
+        columns = (self.x0, self.y0, self.x1, self.y1, self.font_size, self.relative_x, self.relative_y,
+                   self.is_bold, self.is_italic, self.page_number, self.source_code)
+        return sum(c.nbytes for c in columns) + sum(sys.getsizeof(t) for t in set(self.texts))
+
+
+class BlockStoreBuilder:
+    """Accumulates blocks column by column and freezes them into a BlockStore."""
+
+    def __init__(self):
+        # array.array keeps raw machine values, so no float/bool objects pile up while building
+        self.texts = []
+        self.floats = {name: array('d') for name in FLOAT_COLUMNS}
+        self.is_bold = array('b')
+        self.is_italic = array('b')
+        self.page_number = array('i')
+        self.source_code = array('B')
+        self.page_sizes = {}
+        self.sources = {}
+
+    def set_page_size(self, page_number: int, width: float, height: float):
+        self.page_sizes.setdefault(page_number, (width, height))
+
+    def add(self, text: str, x0: float, y0: float, x1: float, y1: float, font_size: float, is_bold: bool,
+            is_italic: bool, page_number: int, relative_x: float, relative_y: float, source: str = 'digital'):
+        self.texts.append(sys.intern(text))
+        floats = self.floats
+        floats['x0'].append(x0)
+        floats['y0'].append(y0)
+        floats['x1'].append(x1)
+        floats['y1'].append(y1)
+        floats['font_size'].append(font_size)
+        floats['relative_x'].append(relative_x)
+        floats['relative_y'].append(relative_y)
+        self.is_bold.append(is_bold)
+        self.is_italic.append(is_italic)
+        self.page_number.append(page_number)
+        self.source_code.append(self.sources.setdefault(source, len(self.sources)))
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def build(self) -> BlockStore:
+        columns = {name: np.frombuffer(values, dtype=np.float64).copy() for name, values in self.floats.items()}
+        columns['is_bold'] = np.frombuffer(self.is_bold, dtype=np.int8).astype(bool)
+        columns['is_italic'] = np.frombuffer(self.is_italic, dtype=np.int8).astype(bool)
+        columns['page_number'] = np.frombuffer(self.page_number, dtype=np.intc).astype(np.int32)
+        columns['source_code'] = np.frombuffer(self.source_code, dtype=np.uint8).copy()
+        return BlockStore(self.texts, columns, dict(self.page_sizes), list(self.sources))
+
+
+class BlockView(Mapping):
+    """Read-only dict view of one block in a BlockStore (legacy block dict keys)."""
+    __slots__ = ('_store', '_index')
+
+    def __init__(self, store: BlockStore, index: int):
+        self._store = store
+        self._index = index
+
+    def __getitem__(self, key: str) -> Any:
+        s, i = self._store, self._index
+        if key == 'text':
+            return s.texts[i]
+        if key == 'bbox':
+            return {'x0': s.x0[i].item(), 'y0': s.y0[i].item(), 'x1': s.x1[i].item(), 'y1': s.y1[i].item()}
+        if key in ('font_size', 'relative_x', 'relative_y'):
+            return getattr(s, key)[i].item()
+        if key in ('is_bold', 'is_italic'):
+            return bool(getattr(s, key)[i])
+        if key == 'page_number':
+            return int(s.page_number[i])
+        if key == 'line_position':
+            return s.y0[i].item()
+        if key == 'width':
+            return s.x1[i].item() - s.x0[i].item()
+        if key == 'height':
+            return s.y1[i].item() - s.y0[i].item()
+        if key == 'page_width':
+            return s.page_sizes[int(s.page_number[i])][0]
+        if key == 'page_height':
+            return s.page_sizes[int(s.page_number[i])][1]
+        if key == 'source':
+            return s.sources[s.source_code[i]]
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(BLOCK_KEYS)
+
+    def __len__(self) -> int:
+        return len(BLOCK_KEYS)
+
+    def __or__(self, other: Dict[str, Any]) -> Dict[str, Any]:
+        return self.to_dict() | other
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: self[key] for key in BLOCK_KEYS}
+
+    def __repr__(self) -> str:
+        return f"BlockView({self.to_dict()!r})"
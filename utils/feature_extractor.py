@@ -1,7 +1,16 @@
 import re
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple, Union
 import logging
+from utils.blocks import BlockStore
+
+NUMBERED_RE = re.compile(r'^\d+\.')
+HIERARCHICAL_RE = re.compile(r'^\d+\.\d+')
+
+# Spacing reported when there is no neighbouring block on the same page
+EDGE_SPACING = 50.0
+# Part of the training feature-cache key; bump whenever the feature columns change
+FEATURE_VERSION = 1
 
 class FeatureExtractor:
     """Extracts a comprehensive set of features for high-accuracy heading classification."""
@@ -10,7 +19,151 @@ class FeatureExtractor:
         logging.basicConfig(level=logging.INFO, format='%(name)s - %(levelname)s - %(message)s')
         self.logger = logging.getLogger(__name__)
 
-    def extract_features(self, blocks: List[Dict[str, Any]]) -> np.ndarray:
+    def extract_features(self, blocks: Union[BlockStore, List[Dict[str, Any]]],
+                         rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Columnar feature matrix; bit-identical to _extract_features_per_block.
+
+        rows restricts the output to those block indices. Document-level font
+        statistics and neighbour spacing still use every block, so each row is
+        identical to the same row of the full matrix.
+        """
+        if not blocks:
+            return np.array([])
+        if isinstance(blocks, BlockStore):
+            return self._feature_matrix(**self._columns_from_store(blocks), rows=rows)
+        return self._feature_matrix(**self._columns_from_dicts(blocks), rows=rows)
+
+    @staticmethod
+    def _columns_from_store(store: BlockStore) -> Dict[str, Any]:
+        pages = store.page_number
+        return {
+            'texts': store.texts,
+            'font_size': store.font_size,
+            'relative_x': store.relative_x,
+            'relative_y': store.relative_y,
+            'is_bold': store.is_bold.astype(np.float64),
+            'is_italic': store.is_italic.astype(np.float64),
+            'is_low_fidelity': store.is_low_fidelity.astype(np.float64),
+            'same_page_as_next': pages[1:] == pages[:-1],
+            'line_position': store.line_position,
+            'bottom': store.y1,
+            'font_stats': store.font_stats,
+        }
+
+    @staticmethod
+    def _columns_from_dicts(blocks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        page_numbers = [b.get('page_number') for b in blocks]
+        return {
+            'texts': [b.get('text', '') for b in blocks],
+            'font_size': np.array([b.get('font_size', 0) for b in blocks], dtype=np.float64),
+            'relative_x': np.array([b.get('relative_x', 0) for b in blocks], dtype=np.float64),
+            'relative_y': np.array([b.get('relative_y', 0) for b in blocks], dtype=np.float64),
+            'is_bold': np.array([float(b.get('is_bold', False)) for b in blocks], dtype=np.float64),
+            'is_italic': np.array([float(b.get('is_italic', False)) for b in blocks], dtype=np.float64),
+            'is_low_fidelity': np.array([b.get('source') == 'digital_search' for b in blocks], dtype=np.float64),
+            'same_page_as_next': np.fromiter((page_numbers[i] == page_numbers[i + 1] for i in range(len(blocks) - 1)),
+                                             dtype=bool, count=len(blocks) - 1),
+            'line_position': np.array([b.get('line_position', 0) for b in blocks], dtype=np.float64),
+            # Missing bbox/y1 is NaN here and resolved to the per-block defaults in _spacing_columns
+            'bottom': np.array([b.get('bbox', {}).get('y1', np.nan) for b in blocks], dtype=np.float64),
+            'has_line_position': np.array(['line_position' in b for b in blocks], dtype=bool),
+        }
+
+    def _feature_matrix(self, texts, font_size, relative_x, relative_y, is_bold, is_italic, is_low_fidelity,
+                        same_page_as_next, line_position, bottom, has_line_position=None, font_stats=None,
+                        rows=None) -> np.ndarray:
+        avg_fs, max_fs, min_fs, std_fs = font_stats or self.font_statistics(font_size)
+        spacing_before, spacing_after = self._spacing_columns(same_page_as_next, line_position, bottom,
+                                                              has_line_position)
+
+        if rows is not None:
+            texts = [texts[i] for i in rows]
+            font_size, relative_x, relative_y = font_size[rows], relative_x[rows], relative_y[rows]
+            is_bold, is_italic, is_low_fidelity = is_bold[rows], is_italic[rows], is_low_fidelity[rows]
+            spacing_before, spacing_after = spacing_before[rows], spacing_after[rows]
+        n = len(texts)
+        if n == 0:
+            return np.empty((0, len(self.get_feature_names())))
+
+        text_cols = self._text_feature_columns(texts)
+        word_count, text_length = text_cols[:, 0], text_cols[:, 1]
+
+        # Font and Style Features
+        font_size_ratio = font_size / avg_fs if avg_fs > 0 else np.ones(n)
+        font_size_normalized = (font_size - min_fs) / (max_fs - min_fs) if max_fs > min_fs else np.zeros(n)
+        font_size_z_score = (font_size - avg_fs) / std_fs if std_fs > 0 else np.zeros(n)
+
+        # Positional Features
+        is_near_top = (relative_y < 0.15).astype(np.float64)
+        is_centered = ((0.3 < relative_x) & (relative_x < 0.7) & (word_count < 10)).astype(np.float64)
+
+        # Contextual and Structural Features
+        is_short_line = (word_count < 8).astype(np.float64)
+        is_standalone = (text_length < 100).astype(np.float64)
+        isolation_gap = font_size * 1.5
+        is_isolated = ((spacing_before > isolation_gap) & (spacing_after > isolation_gap)).astype(np.float64)
+
+        # Same column order as _extract_block_features (the order the model was trained on)
+        return np.column_stack([
+            font_size, font_size_ratio, font_size_normalized, font_size_z_score,
+            is_bold, is_italic,
+            text_length, text_cols[:, 2], word_count,
+            relative_x, relative_y, is_near_top, is_centered,
+            text_cols[:, 3], text_cols[:, 4], text_cols[:, 5], text_cols[:, 6],
+            text_cols[:, 7],
+            is_short_line, is_standalone, is_isolated,
+            spacing_before, spacing_after,
+            is_low_fidelity
+        ])
+
+    @staticmethod
+    def font_statistics(font_size: np.ndarray) -> Tuple[float, float, float, float]:
+        """Document-level (mean, max, min, std) of the block font sizes the features are normalised against."""
+        return np.mean(font_size), np.max(font_size), np.min(font_size), np.std(font_size)
+
+    @staticmethod
+    def _text_feature_columns(texts: List[str]) -> np.ndarray:
+        """One pass over the texts. Columns: word_count, text_length, char_count,
+        is_numbered, is_hierarchical, is_all_caps, is_title_case, ends_with_colon."""
+        rows = []
+        append = rows.append
+        for text in texts:
+            word_count = len(text.split())
+            text_length = len(text)
+            stripped = text.strip()
+            # Every \d is a str.isdigit() char, so the cheap check only skips sure misses
+            is_numbered = stripped[:1].isdigit() and NUMBERED_RE.match(stripped) is not None
+            append((
+                word_count,
+                text_length,
+                text_length - text.count(' '),
+                is_numbered,
+                is_numbered and HIERARCHICAL_RE.match(stripped) is not None,
+                word_count > 1 and text_length > 5 and text.isupper(),
+                word_count > 1 and text.istitle(),
+                stripped.endswith(':'),
+            ))
+        return np.array(rows, dtype=np.float64).reshape(len(texts), 8)
+
+    @staticmethod
+    def _spacing_columns(same_page_as_next, line_position, bottom, has_line_position=None):
+        """Vectorised _get_spacing_before/_get_spacing_after using shifted neighbour arrays."""
+        n = len(line_position)
+        has_bottom = ~np.isnan(bottom)
+
+        spacing_before = np.full(n, EDGE_SPACING)
+        prev_bottom = np.where(has_bottom[:-1], bottom[:-1], line_position[1:])
+        spacing_before[1:] = np.where(same_page_as_next, line_position[1:] - prev_bottom, EDGE_SPACING)
+
+        spacing_after = np.full(n, EDGE_SPACING)
+        own_bottom = np.where(has_bottom, bottom, 0.0)
+        next_top = line_position[1:] if has_line_position is None else \
+            np.where(has_line_position[1:], line_position[1:], own_bottom[:-1])
+        spacing_after[:-1] = np.where(same_page_as_next, next_top - own_bottom[:-1], EDGE_SPACING)
+        return spacing_before, spacing_after
+
+    def _extract_features_per_block(self, blocks: List[Dict[str, Any]]) -> np.ndarray:
+        """Reference row-by-row implementation, kept for equivalence checks (see check_features.py)."""
         if not blocks:
             return np.array([])
         
@@ -0,0 +1,158 @@
+import json
+import logging
+import os
+import queue
+import threading
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+from utils.metrics import NULL_METRICS
+
+
+def read_file(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def write_file_atomic(path: str, text: str):
+    """Writes text next to path under a temporary name, then renames it into place."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class OutputWriter:
+    """Writes JSON files atomically on the calling thread.
+
+    compact drops the indentation and separator spaces, which roughly halves
+    the size of layout dumps; the default matches the files written so far.
+    """
+
+    def __init__(self, compact: bool = False):
+        self.compact = compact
+
+    def serialize(self, data: Any) -> str:
+        if self.compact:
+            return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+        return json.dumps(data, indent=2, ensure_ascii=False)
+
+    def write_json(self, path: str, data: Any, doc_metrics=NULL_METRICS, stage: str = 'write'):
+        """Serialises and writes data to path, timed as stage of doc_metrics."""
+        with doc_metrics.timer(stage):
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self._write(path, self.serialize(data))
+
+    def _write(self, path: str, text: str):
+        write_file_atomic(path, text)
+
+    def flush(self) -> List[Tuple[str, Exception]]:
+        """(path, error) of failed writes since the last flush; synchronous writes raise instead."""
+        return []
+
+    def close(self) -> List[Tuple[str, Exception]]:
+        return self.flush()
+
+
+class BackgroundWriter(OutputWriter):
+    """OutputWriter that serialises and writes on a background thread.
+
+    write_json returns once the document is queued and blocks only while
+    max_pending writes are already waiting, which bounds the memory held by
+    queued outputs. The data must not be modified after it is handed over.
+    The stage time is that of the write on the background thread, added to
+    doc_metrics when it finishes. Failed writes are collected and returned
+    by flush() and close().
+    """
+
+    def __init__(self, compact: bool = False, max_pending: int = 32):
+        super().__init__(compact)
+        self._queue = queue.Queue(maxsize=max(1, max_pending))
+        self._errors: List[Tuple[str, Exception]] = []
+        self.logger = logging.getLogger(__name__)
+        self._thread = threading.Thread(target=self._run, name='output-writer', daemon=True)
+        self._thread.start()
+
+    def write_json(self, path: str, data: Any, doc_metrics=NULL_METRICS, stage: str = 'write'):
+        self._queue.put((path, data, doc_metrics, stage))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                path, data, doc_metrics, stage = item
+                try:
+                    super().write_json(path, data, doc_metrics, stage)
+                except Exception as e:
+                    self.logger.error(f"Failed to write {path}: {e}")
+                    self._errors.append((path, e))
+            finally:
+                self._queue.task_done()
+
+    def flush(self) -> List[Tuple[str, Exception]]:
+        """Waits until every queued write has finished."""
+        self._queue.join()
+        errors, self._errors = self._errors, []
+        return errors
+
+    def close(self) -> List[Tuple[str, Exception]]:
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        return self.flush()
+
+
+class PdfPrefetcher:
+    """Reads PDFs ahead of the consumer on a background thread.
+
+    Iterating yields (path, bytes, error) in input order; error is the
+    exception raised while reading, with bytes None. At most depth files wait
+    in the queue, plus the one being read. With depth 0 every file is read on
+    the consumer's thread when it is reached.
+    """
+
+    def __init__(self, paths: List[str], depth: int = 2, reader: Callable[[str], bytes] = read_file):
+        self.paths = paths
+        self.depth = depth
+        self.reader = reader
+        self._stop = threading.Event()
+
+    def _read(self, path: str) -> Tuple[str, Optional[bytes], Optional[Exception]]:
+        try:
+            return path, self.reader(path), None
+        except Exception as e:
+            return path, None, e
+
+    def __iter__(self) -> Iterator[Tuple[str, Optional[bytes], Optional[Exception]]]:
+        if self.depth <= 0:
+            for path in self.paths:
+                yield self._read(path)
+            return
+
+        ready = queue.Queue(maxsize=self.depth)
+
+        def produce():
+            for path in self.paths:
+                item = self._read(path)
+                # Wake up now and then so a consumer that stopped early does not strand the thread
+                while not self._stop.is_set():
+                    try:
+                        ready.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if self._stop.is_set():
+                    return
+
+        thread = threading.Thread(target=produce, name='pdf-prefetch', daemon=True)
+        thread.start()
+        try:
+            for _ in self.paths:
+                yield ready.get()
+        finally:
+            self._stop.set()
+            thread.join()
@@ -0,0 +1,100 @@
+import hashlib
+import logging
+import os
+import tempfile
+from typing import BinaryIO, Callable, Optional, Union
+from utils.blocks import BlockStore
+
+CACHE_SUFFIX = '.blocks.npz'
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's content, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class LayoutCache:
+    """Content-addressed BlockStore cache in one directory, evicting least recently used entries by size."""
+    suffix = CACHE_SUFFIX
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.logger = logging.getLogger(__name__)
+
+    def key_for(self, doc: Union[str, bytes], extractor_key: str) -> str:
+        """Key of a document given by path or by its bytes (both give the same key)."""
+        content_digest = file_digest(doc) if isinstance(doc, str) else hashlib.sha256(doc).hexdigest()
+        digest = hashlib.sha256(content_digest.encode('ascii'))
+        digest.update(extractor_key.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    def get(self, key: str) -> Optional[BlockStore]:
+        path = self._path(key)
+        try:
+            store = BlockStore.load(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.warning(f"Dropping unreadable layout cache entry {path}: {e}")
+            self._remove(path)
+            return None
+        self._touch(path)
+        return store
+
+    @staticmethod
+    def _touch(path: str):
+        """Marks an entry as just used: mtime doubles as the last-used time for eviction."""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by another process since it was read; the loaded copy is still good
+            pass
+
+    def put(self, key: str, store: BlockStore):
+        self._write(key, store.save)
+        self.evict()
+
+    def _write(self, key: str, save: Callable[[BinaryIO], None]):
+        """Writes an entry through a temporary file, so readers never see a partial one."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                save(f)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(self.suffix):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(os.path.join(self.cache_dir, name))
+            total -= size
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -1,98 +1,304 @@
 import fitz
 import logging
+import multiprocessing
 import os
-import json
-import statistics
-from typing import List, Dict, Any
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional, Union, List
+from utils.blocks import BlockStore, BlockStoreBuilder
+from utils.layout_cache import LayoutCache
+from utils.page_cache import CachedPages, ContentHasher, PageCache, page_fingerprint
+from utils.metrics import NULL_METRICS
+from utils.io_pipeline import OutputWriter
+
+# Part of every layout cache key; bump whenever extraction output changes
+EXTRACTOR_VERSION = 1
+
+# Same flags page.get_text("dict") uses when none are given. "dict" output
+# never carries per-glyph data (that is only produced for "rawdict").
+DEFAULT_TEXT_FLAGS = fitz.TEXTFLAGS_DICT
+# Skips decoding embedded images. Faster, but MuPDF then groups text around
+# images differently, so block boundaries can differ from the default.
+TEXT_ONLY_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+
+# Start method of shard worker processes; forkserver starts quickly without forking a threaded process
+SHARD_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def open_pdf(doc: Union[str, bytes]) -> fitz.Document:
+    """Opens a PDF from a path or from its bytes (never written to disk)."""
+    if isinstance(doc, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=doc, filetype='pdf')
+    return fitz.open(doc)
 
 
 class LayoutExtractor:
-    def __init__(self):
+    def __init__(self, text_flags: Optional[int] = None, use_cache: bool = False,
+                 cache_max_bytes: int = 512 * 1024 * 1024, dump_json: bool = True,
+                 shard_workers: int = 1, shard_min_pages: int = 100, page_cache: bool = False,
+                 writer: Optional[OutputWriter] = None):
+        self.text_flags = DEFAULT_TEXT_FLAGS if text_flags is None else text_flags
+        # Documents with at least 2 * shard_min_pages pages are split into page
+        # ranges extracted by shard_workers processes (see extract_layout)
+        self.shard_workers = shard_workers
+        self.shard_min_pages = shard_min_pages
+        self.base_font_size = 10
+        self.use_cache = use_cache
+        self.cache_max_bytes = cache_max_bytes
+        self.dump_json = dump_json
+        self.writer = writer or OutputWriter()
+        # Reuse blocks (and predictions) of unchanged pages; replaces the whole-document cache
+        self.page_cache = page_cache
+        self._caches = {}
         logging.basicConfig(level=logging.INFO, format='%(name)s - %(levelname)s - %(message)s')
         self.logger = logging.getLogger(__name__)
 
-    def extract_and_save_layout(self, doc_path: str, output_dir: str) -> List[Dict[str, Any]]:
+    def extract_and_save_layout(self, doc_path: str, output_dir: str, doc_metrics=NULL_METRICS,
+                                pdf_bytes: Optional[bytes] = None) -> Union[BlockStore, List]:
+        """Extracts (or loads from cache) one document's layout and writes the debug dump.
+
+        pdf_bytes, when the caller already read the file, saves reading it
+        again; only documents large enough to be sharded are reopened by path.
+        """
         doc_name = os.path.basename(doc_path)
+        source = doc_path if pdf_bytes is None else pdf_bytes
         base_name = os.path.splitext(doc_name)[0]
         print(f"  - Processing document: {doc_name}")
-        layout_data = []
 
         try:
-            doc = fitz.open(doc_path)
-
-            # Step 1: Compute base font size using median
-            all_font_sizes = []
-            for page in doc:
-                blocks = page.get_text("dict")["blocks"]
-                for block in blocks:
-                    if "lines" not in block:
-                        continue
-                    for line in block["lines"]:
-                        for span in line["spans"]:
-                            all_font_sizes.append(span["size"])
-            base_font_size = statistics.median(all_font_sizes) if all_font_sizes else 10
+            with doc_metrics.timer('extract'):
+                cache = self._cache_for(output_dir) if self.use_cache and not self.page_cache else None
+                cache_key = cache.key_for(source, self.cache_key_suffix()) if cache else None
+                layout_data = cache.get(cache_key) if cache else None
+                cache_hit = layout_data is not None
+                if cache_hit:
+                    self.base_font_size = layout_data.base_font_size
+                elif self.page_cache:
+                    layout_data = self.extract_layout_paged(source, self._page_cache_for(output_dir))
+                else:
+                    layout_data = self.extract_layout(source, shard_path=doc_path)
+                    if cache:
+                        cache.put(cache_key, layout_data)
+            doc_metrics.count('pages', len(layout_data.page_sizes))
+            doc_metrics.count('blocks', len(layout_data))
+            if cache_hit:
+                doc_metrics.count('cache_hits')
+                print(f"  - Layout cache hit for: {doc_name}")
+                return layout_data
+            if self.page_cache:
+                doc_metrics.count('pages_reused', layout_data.pages_reused)
+                print(f"  - Reused {layout_data.pages_reused} of {len(layout_data.page_sizes)} cached pages "
+                      f"for: {doc_name}")
 
-            for page_num, page in enumerate(doc):
-                page_width = page.rect.width
-                page_height = page.rect.height
-                blocks = page.get_text("dict")["blocks"]
-
-                for block in blocks:
-                    if "lines" not in block:
-                        continue
-
-                    block_lines = []
-                    max_font_size = 0
-                    bold_flags = []
-                    italic_flags = []
-                    all_spans = []
-
-                    for line in block["lines"]:
-                        line_text = "".join([span.get("text", "").strip() for span in line["spans"]])
-                        if not line_text.strip():
-                            continue
-                        block_lines.append(line_text)
-
-                        for span in line["spans"]:
-                            max_font_size = max(max_font_size, span["size"])
-                            bold_flags.append("bold" in span.get("font", "").lower())
-                            italic_flags.append("italic" in span.get("font", "").lower())
-                            all_spans.append(span)
-
-                    if not block_lines:
-                        continue
-
-                    block_text = " ".join(block_lines).strip()
-                    x0, y0, x1, y1 = block["bbox"]
-
-                    block_data = {
-                        'text': block_text,
-                        'bbox': {'x0': x0, 'y0': y0, 'x1': x1, 'y1': y1},
-                        'font_size': round(max_font_size, 2),
-                        'is_bold': any(bold_flags),
-                        'is_italic': any(italic_flags),
-                        'page_number': page_num + 1,
-                        'line_position': y0,
-                        'width': x1 - x0,
-                        'height': y1 - y0,
-                        'relative_x': x0 / page_width if page_width > 0 else 0,
-                        'relative_y': y0 / page_height if page_height > 0 else 0,
-                        'page_width': page_width,
-                        'page_height': page_height,
-                        'source': 'digital'
-                    }
-
-                    layout_data.append(block_data)
-
-            # Save layout data
-            os.makedirs(output_dir, exist_ok=True)
-            output_path = os.path.join(output_dir, f"{base_name}.json")
-            with open(output_path, "w", encoding="utf-8") as f:
-                json.dump(layout_data, f, indent=2, ensure_ascii=False)
-            print(f"  - Layout data saved to: {output_path}")
+            # Human-readable dump for debugging; nothing in the pipeline reads it back
+            if self.dump_json:
+                output_path = os.path.join(output_dir, f"{base_name}.json")
+                with doc_metrics.timer('layout_dump'):
+                    layout_dicts = layout_data.to_dicts()
+                self.writer.write_json(output_path, layout_dicts, doc_metrics, 'layout_dump')
+                print(f"  - Layout data saved to: {output_path}")
 
         except Exception as e:
             print(f"[ERROR] Failed to extract layout from {doc_name}: {e}")
             return []
 
         return layout_data
+
+    def extract_layout(self, doc_path: Union[str, bytes], shard_path: Optional[str] = None) -> BlockStore:
+        """Single pass over the document: blocks and font statistics are collected together.
+
+        doc_path may also be the PDF's bytes. Shard workers open the file
+        themselves, so bytes are sharded only when shard_path names their file.
+        """
+        builder = BlockStoreBuilder()
+        font_size_hist = Counter()
+
+        with open_pdf(doc_path) as doc:
+            shard_path = doc_path if isinstance(doc_path, str) else shard_path
+            if self.shard_workers > 1 and doc.page_count >= 2 * self.shard_min_pages and shard_path:
+                return self._extract_layout_sharded(shard_path, doc.page_count)
+            for page_num, page in enumerate(doc):
+                self._extract_page_blocks(page, page_num, font_size_hist, builder)
+
+        # Base font size: median over every span in the document
+        self.base_font_size = self._median_from_histogram(font_size_hist)
+        store = builder.build()
+        store.base_font_size = self.base_font_size
+        return store
+
+    def _extract_layout_sharded(self, doc_path: str, page_count: int) -> BlockStore:
+        """extract_layout over page ranges in worker processes, each opening the PDF itself.
+
+        The shard stores are joined in page order and their font-size histograms
+        summed before the median is taken, so the result equals the serial one.
+        Features are computed on the joined store, so their document-level
+        normalisation is unchanged too.
+        """
+        # Several shards per worker evens out pages that are slower to extract
+        shard_count = max(1, min(self.shard_workers * 4, page_count // self.shard_min_pages))
+        bounds = [page_count * i // shard_count for i in range(shard_count + 1)]
+        # Not fork: the batch runner's prefetch and writer threads may be running
+        with ProcessPoolExecutor(max_workers=min(self.shard_workers, shard_count),
+                                 mp_context=multiprocessing.get_context(SHARD_START_METHOD)) as executor:
+            shards = list(executor.map(_extract_shard, [doc_path] * shard_count, [self.text_flags] * shard_count,
+                                       bounds[:-1], bounds[1:]))
+
+        font_size_hist = Counter()
+        for _, shard_hist in shards:
+            font_size_hist.update(shard_hist)
+        self.base_font_size = self._median_from_histogram(font_size_hist)
+        store = BlockStore.concat([shard_store for shard_store, _ in shards])
+        store.base_font_size = self.base_font_size
+        return store
+
+    def extract_layout_paged(self, doc_path: Union[str, bytes], cache: PageCache) -> BlockStore:
+        """extract_layout that takes the blocks of unchanged pages from a PageCache.
+
+        Pages are looked up by fingerprint, so pages that moved (inserted or
+        deleted pages before them) are reused too and renumbered. The median
+        font size is taken over the summed per-page histograms, and the pages
+        are joined as in sharded extraction, so the store equals extract_layout's.
+        The returned store carries cached_pages (see CachedPages) and pages_reused;
+        new pages are written to the cache with their labels by CachedPages.merge.
+        """
+        keys, pages, histograms, predictions = [], [], [], []
+        font_size_hist = Counter()
+        reused = 0
+        with open_pdf(doc_path) as doc:
+            hasher = ContentHasher(doc)
+            for page_num, page in enumerate(doc):
+                key = cache.key_for_page(page_fingerprint(page, hasher), self.cache_key_suffix())
+                entry = cache.get_page(key)
+                if entry is None:
+                    builder, hist = BlockStoreBuilder(), Counter()
+                    self._extract_page_blocks(page, page_num, hist, builder)
+                    page_store = builder.build()
+                    predictions.append(None)
+                else:
+                    page_store, hist, context, labels = entry
+                    reused += 1
+                    size = next(iter(page_store.page_sizes.values()))
+                    page_store.page_sizes = {page_num + 1: size}
+                    page_store.page_number[:] = page_num + 1
+                    predictions.append((context, labels) if labels is not None else None)
+                keys.append(key)
+                pages.append(page_store)
+                histograms.append(hist)
+                font_size_hist.update(hist)
+
+        self.base_font_size = self._median_from_histogram(font_size_hist)
+        store = BlockStore.concat(pages)
+        store.base_font_size = self.base_font_size
+        store.cached_pages = CachedPages(cache, keys, pages, histograms, predictions)
+        store.pages_reused = reused
+        return store
+
+    def extract_layout_windows(self, doc_path: str, window_pages: int = 50) -> Iterator[BlockStore]:
+        """Yields the layout in page-aligned windows of window_pages pages, one at a time.
+
+        The document-wide base_font_size is only known at the end: it is set on
+        the extractor once the generator is exhausted.
+        """
+        font_size_hist = Counter()
+        builder = BlockStoreBuilder()
+        with fitz.open(doc_path) as doc:
+            for page_num, page in enumerate(doc):
+                self._extract_page_blocks(page, page_num, font_size_hist, builder)
+                if (page_num + 1) % window_pages == 0:
+                    yield builder.build()
+                    builder = BlockStoreBuilder()
+        if builder.page_sizes:
+            yield builder.build()
+        self.base_font_size = self._median_from_histogram(font_size_hist)
+
+    def cache_key_suffix(self) -> str:
+        """Everything besides the PDF bytes that determines extraction output."""
+        return f"layout-v{EXTRACTOR_VERSION}:flags={self.text_flags}"
+
+    def _page_cache_for(self, output_dir: str) -> PageCache:
+        key = ('pages', output_dir)
+        if key not in self._caches:
+            self._caches[key] = PageCache(os.path.join(output_dir, 'page_cache'), self.cache_max_bytes)
+        return self._caches[key]
+
+    def _cache_for(self, output_dir: str) -> LayoutCache:
+        if output_dir not in self._caches:
+            self._caches[output_dir] = LayoutCache(os.path.join(output_dir, 'cache'), self.cache_max_bytes)
+        return self._caches[output_dir]
+
+    def _extract_page_blocks(self, page, page_num: int, font_size_hist: Counter, builder: BlockStoreBuilder):
+        page_width = page.rect.width
+        page_height = page.rect.height
+        builder.set_page_size(page_num + 1, page_width, page_height)
+        blocks = page.get_text("dict", flags=self.text_flags)["blocks"]
+
+        for block in blocks:
+            if "lines" not in block:
+                continue
+
+            block_lines = []
+            max_font_size = 0
+            bold_flags = []
+            italic_flags = []
+
+            for line in block["lines"]:
+                spans = line["spans"]
+                for span in spans:
+                    font_size_hist[span["size"]] += 1
+
+                line_text = "".join([span.get("text", "").strip() for span in spans])
+                if not line_text.strip():
+                    continue
+                block_lines.append(line_text)
+
+                for span in spans:
+                    max_font_size = max(max_font_size, span["size"])
+                    font = span.get("font", "").lower()
+                    bold_flags.append("bold" in font)
+                    italic_flags.append("italic" in font)
+
+            if not block_lines:
+                continue
+
+            block_text = " ".join(block_lines).strip()
+            x0, y0, x1, y1 = block["bbox"]
+
+            builder.add(
+                block_text, x0, y0, x1, y1,
+                font_size=round(max_font_size, 2),
+                is_bold=any(bold_flags),
+                is_italic=any(italic_flags),
+                page_number=page_num + 1,
+                relative_x=x0 / page_width if page_width > 0 else 0,
+                relative_y=y0 / page_height if page_height > 0 else 0,
+                source='digital'
+            )
+
+    @staticmethod
+    def _median_from_histogram(hist: Counter, default: float = 10) -> float:
+        """Same result as statistics.median over the expanded values, without expanding them."""
+        total = sum(hist.values())
+        if total == 0:
+            return default
+        lo_rank, hi_rank = (total - 1) // 2, total // 2
+        lo = hi = None
+        seen = 0
+        for value in sorted(hist):
+            seen += hist[value]
+            if lo is None and seen > lo_rank:
+                lo = value
+            if seen > hi_rank:
+                hi = value
+                break
+        return lo if lo_rank == hi_rank else (lo + hi) / 2
+
+
+def _extract_shard(doc_path: str, text_flags: int, start: int, stop: int):
+    """Pool task: blocks and span font-size histogram of pages [start, stop)."""
+    extractor = LayoutExtractor(text_flags=text_flags, dump_json=False)
+    builder = BlockStoreBuilder()
+    font_size_hist = Counter()
+    with fitz.open(doc_path) as doc:
+        for page_num in range(start, stop):
+            extractor._extract_page_blocks(doc[page_num], page_num, font_size_hist, builder)
+    return builder.build(), font_size_hist
@@ -1,110 +1,467 @@
-from xgboost import XGBClassifier
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score
-import joblib, json, os, numpy as np, logging
-from typing import List, Dict, Any
+import hashlib, json, os, time, numpy as np, logging
+from typing import List, Dict, Any, Optional
 from utils.feature_extractor import FeatureExtractor
+from utils.tree_runtime import CompiledHeadingModel, RUNTIME_FILENAME
+from utils.prefilter import BodyTextFilter
+from utils.layout_cache import file_digest
+from utils.metrics import NULL_METRICS
+
+# xgboost, scikit-learn and joblib are imported inside the methods that need
+# them: loading them dominates start-up, and inference can run without them
+# from the exported runtime artifact.
+
+# Variants trained by train_variants when none are given: the full model, fewer
+# trees, shallower trees, both, and the full model on its most important features
+DEFAULT_VARIANTS = [
+    {'name': 'full', 'n_estimators': 500, 'max_depth': 6},
+    {'name': 'trees100', 'n_estimators': 100, 'max_depth': 6},
+    {'name': 'depth4', 'n_estimators': 500, 'max_depth': 4},
+    {'name': 'small', 'n_estimators': 50, 'max_depth': 3},
+    {'name': 'top12', 'n_estimators': 500, 'max_depth': 6, 'top_features': 12},
+]
+VARIANTS_DIR = 'variants'
+VARIANTS_REPORT = 'variants.json'
+
+
+def select_variant(model_dir: str, latency_budget_us: float, use_runtime: bool = True) -> Optional[str]:
+    """Name of the variant with the best heading F1 whose measured latency fits the budget, or None.
+
+    Latency is the runtime artifact's, or XGBoost's with use_runtime=False
+    (reports written before it was recorded only have the runtime's, which is
+    the slower of the two).
+    """
+    try:
+        with open(os.path.join(model_dir, VARIANTS_DIR, VARIANTS_REPORT), 'r', encoding='utf-8') as f:
+            variants = json.load(f)['variants']
+    except (OSError, ValueError, KeyError):
+        return None
+
+    def latency(v):
+        return v['us_per_block'] if use_runtime else v.get('xgboost_us_per_block', v['us_per_block'])
+
+    fitting = [v for v in variants if latency(v) <= latency_budget_us]
+    if not fitting:
+        return None
+    return max(fitting, key=lambda v: (v['heading_f1'], v['accuracy'], -latency(v)))['name']
+
 
 class LocalHeadingModel:
-    def __init__(self, model_dir: str = "model"):
+    def __init__(self, model_dir: str = "model", prefilter: Optional[BodyTextFilter] = None,
+                 latency_budget_us: Optional[float] = None, use_runtime: bool = True):
         self.model_dir = model_dir
+        # Default for load_model; False always loads the XGBoost model from the joblib files
+        self.use_runtime = use_runtime
+        # Optional rule stage: blocks it flags as body text are labelled NONE without the model
+        self.prefilter = prefilter
+        # Per-block latency budget; load_model then picks a variant from <model_dir>/variants
+        self.latency_budget_us = latency_budget_us
+        self.variant = None
+        # Feature vector columns the classifier was trained on (None = all of them)
+        self.feature_columns = None
         self.classifier = None
         self.scaler = None
         self.label_encoder = None
         self.feature_names = None
+        self.runtime = None
+        # Content hash of the loaded model files; set by load_model
+        self.model_version = None
         os.makedirs(model_dir, exist_ok=True)
         logging.basicConfig(level=logging.INFO, format='%(name)s - %(levelname)s - %(message)s')
         self.logger = logging.getLogger(__name__)
     
-    def train_model(self, training_data_file: str) -> Dict[str, Any]:
-        with open(training_data_file, 'r', encoding='utf-8') as f:
-            training_data = json.load(f)
-        if not training_data:
-            self.logger.error("No training data found.")
-            return {}
-        
-        feature_extractor = FeatureExtractor()
-        features = feature_extractor.extract_features(training_data)
-        labels = [s['label'] for s in training_data]
+    def train_model(self, training_data_file: str, n_jobs: int = -1, n_estimators: int = 500,
+                    early_stopping_rounds: Optional[int] = 20, continue_training: bool = False,
+                    feature_cache_dir: Optional[str] = None) -> Dict[str, Any]:
+        """Trains (or, with continue_training, extends) the classifier and saves it.
+
+        training_data_file is JSONL (one labelled block per line, streamed) or
+        the legacy JSON array. Features are extracted per document in n_jobs
+        processes and cached under feature_cache_dir (default
+        <model_dir>/feature_cache), keyed by the file content and FEATURE_VERSION.
+        Boosting uses the hist tree method and stops once the validation loss
+        has not improved for early_stopping_rounds rounds. Continued training
+        keeps the saved scaler and label encoder, so the new trees see the
+        same inputs as the existing ones.
+        """
+        from sklearn.preprocessing import StandardScaler, LabelEncoder
+        from sklearn.metrics import accuracy_score
+        from utils.training_data import peak_rss_mb
 
-        if len(features) == 0:
-            self.logger.error("No features extracted.")
+        n_jobs = n_jobs if n_jobs and n_jobs > 0 else os.cpu_count() or 1
+        started = time.perf_counter()
+        X, y_str = self._training_matrix(training_data_file, feature_cache_dir, n_jobs)
+        feature_seconds = time.perf_counter() - started
+        if len(X) == 0:
+            self.logger.error("No training data found.")
             return {}
-        
-        self.feature_names = feature_extractor.get_feature_names()
-        X = features
-        y_str = np.array(labels)
+        self.feature_names = FeatureExtractor().get_feature_names()
 
-        # 🔁 Encode string labels to integers
-        self.label_encoder = LabelEncoder()
-        y = self.label_encoder.fit_transform(y_str)
+        previous = None
+        if continue_training:
+            if not self.load_model(use_runtime=False):
+                self.logger.error("Continued training needs the saved joblib model files.")
+                return {}
+            unknown = set(np.unique(y_str)) - set(self.label_encoder.classes_)
+            if unknown:
+                self.logger.error(f"Labels unknown to the existing model: {sorted(unknown)}")
+                return {}
+            previous = self.classifier.get_booster()
+        else:
+            # 🔁 Encode string labels to integers
+            self.label_encoder = LabelEncoder()
+            self.label_encoder.fit(y_str)
+            self.feature_columns = None
+        y = self.label_encoder.transform(y_str)
 
         unique_labels = np.unique(y)
         if len(unique_labels) <= 1:
             self.logger.warning("Only one class in training data. Model cannot be meaningfully trained.")
             return {'accuracy': 1.0}
 
-        label_counts = {label: np.sum(y == label) for label in unique_labels}
-        if any(count < 2 for count in label_counts.values()):
-            self.logger.warning(f"Some classes have only 1 member: {label_counts}. Training without stratification.")
-            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-        else:
-            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+        X_train, y_train, X_eval, y_eval, X_test, y_test = self._training_splits(X, y, early_stopping_rounds)
+        if self.feature_columns is not None:
+            X_train, X_test = X_train[:, self.feature_columns], X_test[:, self.feature_columns]
+            X_eval = X_eval[:, self.feature_columns] if X_eval is not None else None
+        if previous is None:
+            self.scaler = StandardScaler()
+            self.scaler.fit(X_train)
+        eval_set = [(self.scaler.transform(X_eval), y_eval)] if X_eval is not None else None
+        self.classifier, fit_seconds = self._fit_classifier(
+            self.scaler.transform(X_train), y_train, eval_set, n_estimators, 6, n_jobs, early_stopping_rounds, previous)
+
+        y_pred = self.classifier.predict(self.scaler.transform(X_test))
+        accuracy = accuracy_score(y_test, y_pred)
+        self.logger.info(f"Model trained with accuracy: {accuracy:.3f}")
+
+        self._save_model()
+        report = {
+            'accuracy': accuracy,
+            'rows': len(X),
+            'trees': self.classifier.get_booster().num_boosted_rounds(),
+            'best_iteration': getattr(self.classifier, 'best_iteration', None) if eval_set else None,
+            'feature_seconds': feature_seconds,
+            'fit_seconds': fit_seconds,
+            'total_seconds': time.perf_counter() - started,
+            'peak_rss_mb': peak_rss_mb(),
+        }
+        self.logger.info(f"Training took {report['total_seconds']:.1f}s (features {feature_seconds:.1f}s, "
+                         f"fit {fit_seconds:.1f}s), peak RSS {report['peak_rss_mb'] or 0:.0f} MB")
+        return report
+
+    def train_variants(self, training_data_file: str, variants: Optional[List[Dict[str, Any]]] = None,
+                       n_jobs: int = -1, early_stopping_rounds: Optional[int] = 20,
+                       feature_cache_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Trains smaller, faster variants into <model_dir>/variants/<name> and reports their trade-off.
+
+        Every variant is trained and evaluated on the same splits. A variant
+        with 'top_features' keeps that many feature columns, ranked by the
+        importances of the first all-feature variant in the list. Latency is
+        measured on the held-out rows for both predictors load_model can use,
+        the runtime artifact (us_per_block) and XGBoost (xgboost_us_per_block),
+        so regenerate the report on the machine that will serve the model.
+        """
+        from sklearn.preprocessing import StandardScaler, LabelEncoder
+        from sklearn.metrics import accuracy_score, f1_score
+
+        variants = variants or DEFAULT_VARIANTS
+        n_jobs = n_jobs if n_jobs and n_jobs > 0 else os.cpu_count() or 1
+        X, y_str = self._training_matrix(training_data_file, feature_cache_dir, n_jobs)
+        if len(X) == 0:
+            self.logger.error("No training data found.")
+            return []
+        label_encoder = LabelEncoder()
+        y = label_encoder.fit_transform(y_str)
+        if len(label_encoder.classes_) <= 1:
+            self.logger.warning("Only one class in training data. Variants cannot be meaningfully trained.")
+            return []
+
+        X_train, y_train, X_eval, y_eval, X_test, y_test = self._training_splits(X, y, early_stopping_rounds)
+        X_test = np.array(X_test)
+        feature_names = FeatureExtractor().get_feature_names()
+        heading_classes = [i for i, c in enumerate(label_encoder.classes_) if c != 'NONE']
+        importances, report = None, []
+        for spec in variants:
+            columns = None
+            if spec.get('top_features'):
+                if importances is None:
+                    raise ValueError(f"Variant '{spec['name']}' needs an all-feature variant before it")
+                columns = np.sort(np.argsort(-importances, kind='stable')[:spec['top_features']])
+
+            def select(m):
+                return m if columns is None else m[:, columns]
+
+            scaler = StandardScaler()
+            scaler.fit(select(X_train))
+            eval_set = [(scaler.transform(select(X_eval)), y_eval)] if X_eval is not None else None
+            classifier, fit_seconds = self._fit_classifier(scaler.transform(select(X_train)), y_train, eval_set,
+                                                           spec['n_estimators'], spec['max_depth'], n_jobs,
+                                                           early_stopping_rounds)
+            if columns is None and importances is None:
+                importances = classifier.feature_importances_
+
+            variant = LocalHeadingModel(model_dir=os.path.join(self.model_dir, VARIANTS_DIR, spec['name']))
+            variant.classifier, variant.scaler, variant.label_encoder = classifier, scaler, label_encoder
+            variant.feature_names, variant.feature_columns = feature_names, columns
+            variant._save_model()
+            variant.load_model(use_runtime=False)
+            xgboost_seconds = min(self._timed_prediction(variant, X_test) for _ in range(5))
+            variant.load_model(use_runtime=True)
+            y_pred = label_encoder.transform(variant.predict_from_features(X_test.copy()))
+            seconds = min(self._timed_prediction(variant, X_test) for _ in range(5))
+            report.append({
+                'name': spec['name'],
+                'trees': classifier.get_booster().num_boosted_rounds(),
+                'max_depth': spec['max_depth'],
+                'features': [feature_names[i] for i in columns] if columns is not None else len(feature_names),
+                'accuracy': float(accuracy_score(y_test, y_pred)),
+                'heading_f1': float(f1_score(y_test, y_pred, labels=heading_classes, average='macro',
+                                             zero_division=0)),
+                'us_per_block': seconds / len(X_test) * 1e6,
+                'xgboost_us_per_block': xgboost_seconds / len(X_test) * 1e6,
+                'fit_seconds': fit_seconds,
+                'artifact_bytes': os.path.getsize(os.path.join(variant.model_dir, RUNTIME_FILENAME)),
+            })
+            self.logger.info(f"Variant {spec['name']}: heading F1 {report[-1]['heading_f1']:.3f}, "
+                             f"{report[-1]['us_per_block']:.2f} us/block "
+                             f"({report[-1]['xgboost_us_per_block']:.2f} with XGBoost)")
 
-        self.scaler = StandardScaler()
-        X_train_scaled = self.scaler.fit_transform(X_train)
+        report_path = os.path.join(self.model_dir, VARIANTS_DIR, VARIANTS_REPORT)
+        tmp_path = f"{report_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'held_out_blocks': len(X_test), 'variants': report}, f, indent=2)
+        os.replace(tmp_path, report_path)
+        return report
 
-        self.classifier = XGBClassifier(
-            use_label_encoder=False,
+    @staticmethod
+    def _timed_prediction(model: 'LocalHeadingModel', features: np.ndarray) -> float:
+        features = features.copy()
+        started = time.perf_counter()
+        model.predict_from_features(features)
+        return time.perf_counter() - started
+
+    def _training_matrix(self, training_data_file: str, feature_cache_dir: Optional[str], n_jobs: int):
+        from utils.training_data import load_training_matrix
+        cache_dir = feature_cache_dir or os.path.join(self.model_dir, 'feature_cache')
+        return load_training_matrix(training_data_file, cache_dir, n_jobs=n_jobs)
+
+    def _training_splits(self, X, y, early_stopping_rounds: Optional[int]):
+        """(X_train, y_train, X_eval, y_eval, X_test, y_test); the eval split is None without early stopping.
+
+        Early stopping watches a slice of the training split, so the test accuracy stays unbiased.
+        """
+        from sklearn.model_selection import train_test_split
+        X_train, X_test, y_train, y_test = self._split(X, y, 0.2, train_test_split)
+        X_eval = y_eval = None
+        if early_stopping_rounds:
+            X_train, X_eval, y_train, y_eval = self._split(X_train, y_train, 0.1, train_test_split)
+        return X_train, y_train, X_eval, y_eval, X_test, y_test
+
+    @staticmethod
+    def _fit_classifier(X_train, y_train, eval_set, n_estimators: int, max_depth: int, n_jobs: int,
+                        early_stopping_rounds: Optional[int], previous=None):
+        """(fitted XGBClassifier, seconds); previous is a booster to add trees to."""
+        from xgboost import XGBClassifier
+        classifier = XGBClassifier(
             eval_metric='mlogloss',
-            max_depth=6,
-            n_estimators=100,
+            max_depth=max_depth,
+            n_estimators=n_estimators,
             learning_rate=0.1,
-            random_state=42
+            random_state=42,
+            tree_method='hist',
+            n_jobs=n_jobs,
+            early_stopping_rounds=early_stopping_rounds if eval_set else None,
         )
-        self.classifier.fit(X_train_scaled, y_train)
-
-        X_test_scaled = self.scaler.transform(X_test)
-        y_pred = self.classifier.predict(X_test_scaled)
-        accuracy = accuracy_score(y_test, y_pred)
-        self.logger.info(f"Model trained with accuracy: {accuracy:.3f}")
+        started = time.perf_counter()
+        classifier.fit(X_train, y_train, eval_set=eval_set, verbose=False, xgb_model=previous)
+        return classifier, time.perf_counter() - started
 
-        self._save_model()
-        return {'accuracy': accuracy}
+    def _split(self, X, y, test_size: float, train_test_split):
+        """Stratified split when every class has at least two members."""
+        counts = np.bincount(y)
+        if np.any((counts > 0) & (counts < 2)):
+            label_counts = {label: int(n) for label, n in enumerate(counts) if n}
+            self.logger.warning(f"Some classes have only 1 member: {label_counts}. Training without stratification.")
+            return train_test_split(X, y, test_size=test_size, random_state=42)
+        return train_test_split(X, y, test_size=test_size, random_state=42, stratify=y)
     
     def predict(self, blocks: List[Dict[str, Any]]) -> List[str]:
-        if not self.classifier or not self.scaler or not self.label_encoder:
+        return self.predict_batch([blocks])[0]
+
+    def predict_batch(self, documents: List[List[Dict[str, Any]]], fold_scaler: bool = True,
+                      doc_metrics: Optional[List] = None) -> List[List[str]]:
+        """Predicts labels for many documents with one scaler pass and one booster call.
+
+        Features are still extracted per document, since the font statistics
+        they are normalised against are document-level. With fold_scaler the
+        StandardScaler is applied in place on the stacked matrix instead of
+        through scaler.transform, which would copy it (the arithmetic is the same).
+        doc_metrics (one per document) receive feature time, row counts and a
+        share of the model call proportional to their row count.
+        """
+        if not self.is_loaded():
             self.logger.error("Model not loaded.")
-            return ['NONE'] * len(blocks)
+            return [['NONE'] * len(blocks) for blocks in documents]
+
+        feature_extractor = FeatureExtractor()
+        doc_metrics = doc_metrics or [NULL_METRICS] * len(documents)
+        rows, matrices = [], []
+        for blocks, metrics in zip(documents, doc_metrics):
+            with metrics.timer('features'):
+                rows.append(self._model_rows(blocks))
+                matrices.append(feature_extractor.extract_features(blocks, rows[-1]))
+            metrics.count('blocks_classified', len(matrices[-1]))
+        counts = [len(m) for m in matrices]
+        if not any(counts):
+            return [['NONE'] * len(blocks) for blocks in documents]
+
+        features = np.vstack([m for m in matrices if len(m)])
+        started = time.perf_counter()
+        labels = self.predict_from_features(features, fold_scaler)
+        model_seconds = time.perf_counter() - started
+        for metrics, count in zip(doc_metrics, counts):
+            metrics.add_time('model', model_seconds * count / len(features))
+        return self._split_per_document(documents, rows, counts, labels)
 
-        features = FeatureExtractor().extract_features(blocks)
-        if len(features) == 0:
-            return ['NONE'] * len(blocks)
+    def predict_from_features(self, features: np.ndarray, fold_scaler: bool = True) -> List[str]:
+        """Labels for an unscaled feature matrix. With fold_scaler, features is scaled in place."""
+        if self.runtime is not None:
+            features = self.runtime.scale_inplace(features if fold_scaler else features.copy())
+            return self.runtime.classes[self.runtime.predict_class_indices(features)].tolist()
+
+        if self.feature_columns is not None:
+            # Column selection copies, so the caller's matrix is left alone either way
+            features = features[:, self.feature_columns]
+        if fold_scaler:
+            if self.scaler.with_mean:
+                features -= self.scaler.mean_
+            if self.scaler.with_std:
+                features /= self.scaler.scale_
+        else:
+            features = self.scaler.transform(features)
 
-        features_scaled = self.scaler.transform(features)
-        preds = self.classifier.predict(features_scaled)
-        
         # 🔁 Decode integer predictions to string labels
-        return self.label_encoder.inverse_transform(preds).tolist()
-    
+        return self.label_encoder.classes_[self._predict_encoded(features)].tolist()
+
+    def _model_rows(self, blocks) -> Optional[np.ndarray]:
+        """Indices of the blocks the model has to see, or None for all of them."""
+        if self.prefilter is None or not blocks:
+            return None
+        skipped = self.prefilter.body_text_mask(blocks)
+        self.logger.debug(f"Pre-filter labelled {int(skipped.sum())} of {len(blocks)} blocks as body text")
+        return np.flatnonzero(~skipped)
+
+    @staticmethod
+    def _split_per_document(documents, rows, counts: List[int], labels: List[str]) -> List[List[str]]:
+        results, start = [], 0
+        for blocks, doc_rows, count in zip(documents, rows, counts):
+            doc_labels = labels[start:start + count]
+            start += count
+            if doc_rows is None:
+                results.append(doc_labels if count else ['NONE'] * len(blocks))
+                continue
+            full = ['NONE'] * len(blocks)
+            for i, label in zip(doc_rows.tolist(), doc_labels):
+                full[i] = label
+            results.append(full)
+        return results
+
+    def _predict_encoded(self, features_scaled: np.ndarray) -> np.ndarray:
+        """XGBClassifier.predict without the sklearn wrapper overhead: one in-place booster call."""
+        try:
+            iteration_range = (0, self.classifier.best_iteration + 1)
+        except AttributeError:
+            iteration_range = (0, 0)
+        probs = self.classifier.get_booster().inplace_predict(
+            features_scaled, iteration_range=iteration_range, missing=self.classifier.missing)
+        if probs.ndim > 1 and probs.shape[1] > 1:
+            return np.argmax(probs, axis=1)
+        return (probs.reshape(-1) > 0.5).astype(np.int64)
+
+    def is_loaded(self) -> bool:
+        return self.runtime is not None or bool(self.classifier and self.scaler and self.label_encoder)
+
+    def export_runtime(self, path: Optional[str] = None) -> str:
+        """Writes classifier, scaler, label classes and feature names into one inference artifact."""
+        if not (self.classifier and self.scaler and self.label_encoder):
+            raise RuntimeError("Load or train the XGBoost model before exporting it.")
+        path = path or os.path.join(self.model_dir, RUNTIME_FILENAME)
+        CompiledHeadingModel.export(self.classifier, self.scaler, self.label_encoder, self.feature_names, path,
+                                    self.feature_columns)
+        self.logger.info(f"Runtime model exported to {path}")
+        return path
+
     def _save_model(self):
+        import joblib
         joblib.dump(self.classifier, os.path.join(self.model_dir, 'heading_classifier.joblib'))
         joblib.dump(self.scaler, os.path.join(self.model_dir, 'feature_scaler.joblib'))
         joblib.dump(self.label_encoder, os.path.join(self.model_dir, 'label_encoder.joblib'))
         with open(os.path.join(self.model_dir, 'feature_names.json'), 'w') as f:
             json.dump(self.feature_names, f)
+        columns_path = os.path.join(self.model_dir, 'feature_columns.json')
+        if self.feature_columns is not None:
+            with open(columns_path, 'w') as f:
+                json.dump([int(c) for c in self.feature_columns], f)
+        elif os.path.exists(columns_path):
+            os.remove(columns_path)
+        # Keep the inference artifact in step with the joblib files
+        self.runtime = None
+        self.export_runtime()
         self.logger.info("Model saved successfully.")
     
-    def load_model(self) -> bool:
+    def load_model(self, use_runtime: Optional[bool] = None) -> bool:
+        """Loads the exported runtime artifact when present (no xgboost/sklearn import), else the joblib files.
+
+        use_runtime (default: the constructor's) False loads the XGBoost model
+        even when the runtime exists: importing xgboost costs most of a second,
+        which only very large batches win back. With a latency budget the model
+        comes from the best variant that fits it (see select_variant), falling
+        back to model_dir itself.
+        """
+        model_dir = self.model_dir
+        if use_runtime is None:
+            use_runtime = self.use_runtime
+        if self.latency_budget_us is not None:
+            # Budgeted against the latency of the predictor that will actually be loaded
+            self.variant = select_variant(self.model_dir, self.latency_budget_us, use_runtime)
+            if self.variant:
+                model_dir = os.path.join(self.model_dir, VARIANTS_DIR, self.variant)
+                self.logger.info(f"Using model variant '{self.variant}' for a {self.latency_budget_us:g} us/block budget")
+            else:
+                self.logger.warning(f"No model variant fits {self.latency_budget_us:g} us/block; using the main model")
+
+        runtime_path = os.path.join(model_dir, RUNTIME_FILENAME)
+        if use_runtime and os.path.exists(runtime_path):
+            try:
+                self.runtime = CompiledHeadingModel.load(runtime_path)
+                self.feature_names = self.runtime.feature_names
+                self.model_version = self._files_version([runtime_path])
+                self.logger.info("Runtime model loaded successfully.")
+                return True
+            except Exception as e:
+                self.logger.warning(f"Could not load runtime model, falling back to joblib files: {e}")
+
         try:
-            self.classifier = joblib.load(os.path.join(self.model_dir, 'heading_classifier.joblib'))
-            self.scaler = joblib.load(os.path.join(self.model_dir, 'feature_scaler.joblib'))
-            self.label_encoder = joblib.load(os.path.join(self.model_dir, 'label_encoder.joblib'))
-            with open(os.path.join(self.model_dir, 'feature_names.json'), 'r') as f:
+            import joblib
+            self.runtime = None
+            self.classifier = joblib.load(os.path.join(model_dir, 'heading_classifier.joblib'))
+            self.scaler = joblib.load(os.path.join(model_dir, 'feature_scaler.joblib'))
+            self.label_encoder = joblib.load(os.path.join(model_dir, 'label_encoder.joblib'))
+            with open(os.path.join(model_dir, 'feature_names.json'), 'r') as f:
                 self.feature_names = json.load(f)
+            columns_path = os.path.join(model_dir, 'feature_columns.json')
+            self.feature_columns = None
+            if os.path.exists(columns_path):
+                with open(columns_path, 'r') as f:
+                    self.feature_columns = np.array(json.load(f), dtype=np.intp)
+            self.model_version = self._files_version([os.path.join(model_dir, name) for name in (
+                'heading_classifier.joblib', 'feature_scaler.joblib', 'label_encoder.joblib')])
             self.logger.info("Model loaded successfully.")
             return True
         except Exception as e:
             self.logger.error(f"Error loading model: {str(e)}")
             return False
+
+    @staticmethod
+    def _files_version(paths: List[str]) -> str:
+        return file_digest(paths[0])[:16] if len(paths) == 1 else \
+            hashlib.sha256(''.join(file_digest(p) for p in paths).encode('ascii')).hexdigest()[:16]
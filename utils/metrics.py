@@ -0,0 +1,157 @@
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional
+
+# Stage timers the pipeline records, in pipeline order
+STAGES = ('outline', 'extract', 'layout_dump', 'features', 'model', 'postprocess', 'write')
+# Upper bounds (seconds) of the per-document latency histogram in the Prometheus export
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_enabled = False
+
+
+def enable(on: bool = True):
+    """Turns metric collection on for this process (worker processes enable it in their initializer)."""
+    global _enabled
+    _enabled = on
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+class DocumentMetrics:
+    """Stage timers and counters for one document."""
+    __slots__ = ('seconds', 'counts')
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.counts = Counter()
+
+    def timer(self, stage: str) -> '_StageTimer':
+        return _StageTimer(self, stage)
+
+    def add_time(self, stage: str, seconds: float):
+        self.seconds[stage] += seconds
+
+    def count(self, name: str, value: int = 1):
+        self.counts[name] += value
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The document's stage seconds and counters. The dicts are shared, not copied: a write
+        still queued on a BackgroundWriter adds its time when it finishes."""
+        return {'seconds': self.seconds, 'counts': self.counts}
+
+
+class _StageTimer:
+    __slots__ = ('metrics', 'stage', 'started')
+
+    def __init__(self, metrics: DocumentMetrics, stage: str):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.metrics.seconds[self.stage] += time.perf_counter() - self.started
+
+
+class _NullDocumentMetrics:
+    """Stands in for DocumentMetrics when collection is off: every call is a no-op."""
+    __slots__ = ()
+    _timer = nullcontext()
+
+    def timer(self, stage: str):
+        return self._timer
+
+    def add_time(self, stage: str, seconds: float):
+        pass
+
+    def count(self, name: str, value: int = 1):
+        pass
+
+    def to_dict(self) -> None:
+        return None
+
+
+NULL_METRICS = _NullDocumentMetrics()
+
+
+def document_metrics():
+    """A fresh DocumentMetrics, or the shared no-op stand-in when collection is off."""
+    return DocumentMetrics() if _enabled else NULL_METRICS
+
+
+class MetricsSink:
+    """Collects per-document reports and exports them.
+
+    jsonl_path gets one JSON line per document (appended as documents finish).
+    prometheus_path is rewritten atomically on every flush() with cumulative
+    counters, per-stage seconds and a per-document latency histogram, in the
+    text format node_exporter's textfile collector reads.
+    """
+
+    def __init__(self, jsonl_path: Optional[str] = None, prometheus_path: Optional[str] = None):
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.documents = Counter()
+        self.stage_seconds = defaultdict(float)
+        self.counts = Counter()
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+        self.latency_sum = 0.0
+        self.latency_count = 0
+
+    def add(self, report: Dict[str, Any]):
+        metrics = report.get('metrics') or {'seconds': {}, 'counts': {}}
+        self.documents[report['path']] += 1
+        for stage, seconds in metrics['seconds'].items():
+            self.stage_seconds[stage] += seconds
+        self.counts.update(metrics['counts'])
+        seconds = report.get('seconds', 0.0)
+        self.latency_sum += seconds
+        self.latency_count += 1
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.latency_buckets[i] += 1
+
+        if self.jsonl_path:
+            record = {'time': time.time(), 'document': report['pdf'], 'path': report['path'],
+                      'total_seconds': seconds, 'stage_seconds': metrics['seconds'], 'counts': metrics['counts']}
+            with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + '\n')
+
+    def add_all(self, reports: List[Dict[str, Any]]):
+        for report in reports:
+            self.add(report)
+        self.flush()
+
+    def flush(self):
+        if not self.prometheus_path:
+            return
+        tmp_path = f"{self.prometheus_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, self.prometheus_path)
+
+    def prometheus_text(self) -> str:
+        lines = ['# HELP pdf_outline_documents_total Documents processed, by the path that produced the output.',
+                 '# TYPE pdf_outline_documents_total counter']
+        lines += [f'pdf_outline_documents_total{{path="{path}"}} {n}' for path, n in sorted(self.documents.items())]
+        lines += ['# HELP pdf_outline_stage_seconds_total Time spent in each pipeline stage.',
+                  '# TYPE pdf_outline_stage_seconds_total counter']
+        lines += [f'pdf_outline_stage_seconds_total{{stage="{stage}"}} {self.stage_seconds[stage]:.6f}'
+                  for stage in STAGES if stage in self.stage_seconds]
+        for name, n in sorted(self.counts.items()):
+            lines += [f'# TYPE pdf_outline_{name}_total counter', f'pdf_outline_{name}_total {n}']
+        lines += ['# HELP pdf_outline_document_seconds Wall-clock time per document.',
+                  '# TYPE pdf_outline_document_seconds histogram']
+        lines += [f'pdf_outline_document_seconds_bucket{{le="{bound}"}} {n}'
+                  for bound, n in zip(LATENCY_BUCKETS, self.latency_buckets)]
+        lines += [f'pdf_outline_document_seconds_bucket{{le="+Inf"}} {self.latency_count}',
+                  f'pdf_outline_document_seconds_sum {self.latency_sum:.6f}',
+                  f'pdf_outline_document_seconds_count {self.latency_count}']
+        return '\n'.join(lines) + '\n'
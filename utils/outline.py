@@ -0,0 +1,70 @@
+import fitz
+import logging
+import re
+from typing import Any, Dict, List, Optional, Union
+from utils.layout_utils import open_pdf
+
+# Metadata titles that are really file names ("report_v3.docx", "flyer.cdr")
+FILENAME_TITLE_RE = re.compile(r'\.(pdf|docx?|rtf|odt|pptx?|xlsx?|indd|cdr|ai|psd|qxd|txt)$', re.IGNORECASE)
+
+
+class OutlineExtractor:
+    """Builds the PostProcessor output schema straight from a PDF's embedded outline (bookmarks).
+
+    The outline is used only when it passes a quality check: at least
+    min_entries usable entries, every target page inside the document, and
+    well-formed levels. Otherwise extract() returns None and the caller runs
+    the normal layout/model pipeline.
+    """
+
+    def __init__(self, min_entries: int = 3, max_level: int = 3):
+        self.min_entries = min_entries
+        self.max_level = max_level
+        self.logger = logging.getLogger(__name__)
+
+    def extract(self, doc: Union[str, bytes, fitz.Document], pdf_name: str) -> Optional[Dict[str, Any]]:
+        if not isinstance(doc, fitz.Document):
+            with open_pdf(doc) as opened:
+                return self.extract(opened, pdf_name)
+
+        entries = [(level, ' '.join(title.split()), page) for level, title, page in doc.get_toc(simple=True)]
+        reason = self._rejection_reason(entries, doc.page_count)
+        if reason:
+            self.logger.debug(f"Outline of {pdf_name} not used: {reason}")
+            return None
+
+        title = None
+        top_level = [e for e in entries if e[0] == 1]
+        if len(top_level) == 1 and entries[0][0] == 1 and len(entries) > 1:
+            # A single root entry is the document title; its children become the H1s
+            title = entries[0][1]
+            entries = [(level - 1, text, page) for level, text, page in entries[1:]]
+
+        headings = [{'level': f"H{level}", 'text': text, 'page': page}
+                    for level, text, page in entries if level <= self.max_level]
+        if title is None:
+            title = self._metadata_title(doc) or next(
+                (h['text'] for h in headings if h['level'] == 'H1' and h['page'] == 1), "No Title Found")
+
+        return {'pdf_name': pdf_name, 'title': title, 'headings': headings}
+
+    def _rejection_reason(self, entries: List[tuple], page_count: int) -> Optional[str]:
+        if len(entries) < self.min_entries:
+            return f"{len(entries)} entries (minimum {self.min_entries})"
+        if any(not text for _, text, _ in entries):
+            return "empty entry titles"
+        if any(not 1 <= page <= page_count for _, _, page in entries):
+            return "entries pointing outside the document"
+        previous_level = 0
+        for level, _, _ in entries:
+            if level < 1 or level > previous_level + 1:
+                return "malformed levels"
+            previous_level = level
+        return None
+
+    @staticmethod
+    def _metadata_title(doc: fitz.Document) -> Optional[str]:
+        title = ' '.join((doc.metadata or {}).get('title', '').split())
+        if not title or FILENAME_TITLE_RE.search(title):
+            return None
+        return title
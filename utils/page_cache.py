@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import re
+import sys
+from collections import Counter
+from typing import List, Optional, Tuple
+import numpy as np
+from utils.blocks import BlockStore, COLUMNS
+from utils.feature_extractor import FeatureExtractor
+from utils.layout_cache import LayoutCache
+
+PAGE_SUFFIX = '.page'
+PAGE_MAGIC = b'PAGEBLK1'
+# On-disk dtype of every BlockStore column, in file order
+PAGE_COLUMNS = tuple((name, np.float64) for name in COLUMNS[:7]) + (
+    ('is_bold', np.bool_), ('is_italic', np.bool_), ('page_number', np.int32), ('source_code', np.uint8))
+
+
+# Indirect references, and the entries that say where an object sits in the
+# file rather than what it draws: the page's tree node and structure index, an
+# annotation's page, and stream lengths (the decoded stream is hashed instead)
+_REFERENCE = re.compile(r'(\d+) \d+ R\b')
+_PLACEMENT = re.compile(r'/(?:Parent|P|StructParents|Length)\s+(?:\d+ \d+ R\b|\d+)')
+
+
+class ContentHasher:
+    """Hashes PDF objects by what they contain rather than where they are.
+
+    An object hashes as its source with placement entries dropped and every
+    indirect reference replaced by the referenced object's hash, followed by
+    its decoded stream, so renumbering, reordering or re-saving the file leaves
+    the hash unchanged. One hasher per open document: objects shared between
+    pages (fonts, images) are hashed once.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self._hashes = {}
+        self._active = set()
+
+    def object_hash(self, xref: int) -> Tuple[str, bool]:
+        """(hash of object xref, whether it is final). A reference cycle hashes the
+        repeated object as a marker, which depends on where the walk entered the
+        cycle, so such hashes are not kept."""
+        if xref in self._hashes:
+            return self._hashes[xref], True
+        if xref in self._active or not 0 < xref < self.doc.xref_length():
+            return 'cycle' if xref in self._active else 'missing', xref not in self._active
+        self._active.add(xref)
+        try:
+            digest, final = self.source_hash(self.doc.xref_object(xref, compressed=True))
+            if self.doc.xref_is_stream(xref):
+                digest.update(self.doc.xref_stream(xref) or b'')
+        finally:
+            self._active.discard(xref)
+        if final:
+            self._hashes[xref] = digest.hexdigest()
+        return digest.hexdigest(), final
+
+    def source_hash(self, source: str):
+        """(sha256 over a PDF object's source with references resolved, whether it is final)."""
+        final = True
+
+        def resolve(match):
+            nonlocal final
+            value, whole = self.object_hash(int(match.group(1)))
+            final = final and whole
+            return value
+
+        return hashlib.sha256(_REFERENCE.sub(resolve, _PLACEMENT.sub('', source)).encode('utf-8')), final
+
+
+def page_fingerprint(page, hasher: Optional[ContentHasher] = None) -> str:
+    """Hash of what text extraction reads from a page.
+
+    Covers the page object resolved by content (content streams, resources
+    with their fonts, images and nested XObjects, annotations), resources
+    inherited from the page tree, and the page's box and rotation. Pass one
+    ContentHasher per document to hash shared objects once.
+    """
+    doc = page.parent
+    hasher = hasher or ContentHasher(doc)
+    digest, _ = hasher.source_hash(doc.xref_object(page.xref, compressed=True))
+    xref = page.xref
+    if 'Resources' not in doc.xref_get_keys(xref):
+        while True:
+            kind, value = doc.xref_get_key(xref, 'Parent')
+            if kind != 'xref':
+                break
+            xref = int(value.split()[0])
+            kind, value = doc.xref_get_key(xref, 'Resources')
+            if kind != 'null':
+                digest.update(hasher.source_hash(value)[0].digest())
+                break
+    digest.update(repr((tuple(page.rect), page.rotation)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class PageCache(LayoutCache):
+    """LayoutCache of single pages keyed by page fingerprint.
+
+    Each entry holds the page's blocks, the histogram of its span font sizes
+    (for the document median) and, once classified, its labels together with
+    the prediction context they were computed in. Entries are one read each:
+    PAGE_MAGIC | uint64 header length | JSON header | raw block columns.
+    A long document has many small pages, so an .npz per page would spend
+    most of a cache hit opening zip members.
+    """
+    suffix = PAGE_SUFFIX
+
+    def key_for_page(self, fingerprint: str, extractor_key: str) -> str:
+        return hashlib.sha256(f"{fingerprint}:{extractor_key}".encode('utf-8')).hexdigest()
+
+    def get_page(self, key: str) -> Optional[Tuple[BlockStore, Counter, Optional[str], Optional[List[str]]]]:
+        """(blocks, span font-size histogram, prediction context, labels), or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            entry = self._decode(data)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.warning(f"Dropping unreadable page cache entry {path}: {e}")
+            self._remove(path)
+            return None
+        self._touch(path)
+        return entry
+
+    def put_page(self, key: str, store: BlockStore, hist: Counter, context: Optional[str] = None,
+                 labels: Optional[List[str]] = None):
+        """Stores a page without evicting; call evict() once the document is done."""
+        header = json.dumps({
+            'texts': store.texts,
+            'page_sizes': [[page, w, h] for page, (w, h) in store.page_sizes.items()],
+            'sources': store.sources,
+            'hist': [[size, count] for size, count in hist.items()],
+            'context': context,
+            'labels': labels,
+        }).encode('utf-8')
+        columns = b''.join(np.ascontiguousarray(getattr(store, name), dtype=dtype).tobytes()
+                           for name, dtype in PAGE_COLUMNS)
+        self._write(key, lambda f: f.write(PAGE_MAGIC + len(header).to_bytes(8, 'little') + header + columns))
+
+    @staticmethod
+    def _decode(data: bytes) -> Tuple[BlockStore, Counter, Optional[str], Optional[List[str]]]:
+        if data[:len(PAGE_MAGIC)] != PAGE_MAGIC:
+            raise ValueError("not a page cache entry")
+        header_end = len(PAGE_MAGIC) + 8 + int.from_bytes(data[len(PAGE_MAGIC):len(PAGE_MAGIC) + 8], 'little')
+        header = json.loads(data[len(PAGE_MAGIC) + 8:header_end].decode('utf-8'))
+        n, offset, columns = len(header['texts']), header_end, {}
+        for name, dtype in PAGE_COLUMNS:
+            # Copies, so columns are aligned and writable (page numbers are rewritten on reuse)
+            columns[name] = np.frombuffer(data, dtype=dtype, count=n, offset=offset).copy()
+            offset += n * np.dtype(dtype).itemsize
+        store = BlockStore([sys.intern(t) for t in header['texts']], columns,
+                           {page: (w, h) for page, w, h in header['page_sizes']}, header['sources'])
+        return store, Counter(dict(map(tuple, header['hist']))), header['context'], header['labels']
+
+
+class CachedPages:
+    """Page-cache state of one extracted document, attached to its BlockStore as cached_pages.
+
+    pages[i] is the BlockStore of page i, stored in the cache under keys[i];
+    predictions[i] is (context, labels) when the cache had labels for it.
+    Predictions are reusable only under the same context: the same model and
+    pre-filter, and the same document-level font statistics, which an edit
+    elsewhere in the document can change.
+    """
+
+    def __init__(self, cache: PageCache, keys: List[str], pages: List[BlockStore], histograms: List[Counter],
+                 predictions: List[Optional[Tuple[str, List[str]]]]):
+        self.cache = cache
+        self.keys = keys
+        self.pages = pages
+        self.histograms = histograms
+        self.predictions = predictions
+
+    def pending(self, store: BlockStore, context: str) -> Tuple[BlockStore, List[int]]:
+        """(blocks of the pages that still need the model, their page indices).
+
+        The returned store carries the whole document's font statistics, so its
+        feature rows equal the same rows of the full document (neighbour
+        spacing never crosses a page boundary).
+        """
+        stale = [i for i, p in enumerate(self.predictions) if p is None or p[0] != context]
+        if len(stale) == len(self.pages):
+            return store, stale
+        subset = BlockStore.concat([self.pages[i] for i in stale])
+        subset.base_font_size = store.base_font_size
+        subset.font_stats = FeatureExtractor.font_statistics(store.font_size)
+        return subset, stale
+
+    def merge(self, context: str, stale: List[int], labels: List[str]) -> List[str]:
+        """Labels for every block: cached pages' labels plus the new ones, which are written back."""
+        fresh, start = {}, 0
+        for i in stale:
+            fresh[i] = labels[start:start + len(self.pages[i])]
+            start += len(self.pages[i])
+            self.cache.put_page(self.keys[i], self.pages[i], self.histograms[i], context, fresh[i])
+            self.predictions[i] = (context, fresh[i])
+        if stale:
+            self.cache.evict()
+        merged = []
+        for i in range(len(self.pages)):
+            merged.extend(fresh[i] if i in fresh else self.predictions[i][1])
+        return merged
@@ -0,0 +1,334 @@
+import hashlib
+import os
+import tempfile
+import time
+import numpy as np
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from utils.local_model import LocalHeadingModel
+from utils.layout_utils import LayoutExtractor
+from utils.postprocess import PostProcessor
+from utils.outline import OutlineExtractor
+from utils.blocks import BlockStore
+from utils.feature_extractor import FeatureExtractor
+from utils.io_pipeline import OutputWriter, PdfPrefetcher, read_file
+from utils import metrics
+
+# Per-process state for pool workers, filled once by _init_worker
+_worker_state = {}
+
+
+def process_pdf(pdf_path: str, local_model: LocalHeadingModel, layout_extractor: LayoutExtractor,
+                post_processor: PostProcessor, layout_dir: str,
+                outline_extractor: Optional[OutlineExtractor] = None) -> Dict[str, Any]:
+    """Runs one PDF through extraction, prediction and post-processing. Returns its report."""
+    return process_pdf_group([pdf_path], local_model, layout_extractor, post_processor, layout_dir,
+                             outline_extractor)[0]
+
+
+def process_pdf_group(pdf_paths: List[str], local_model: LocalHeadingModel, layout_extractor: LayoutExtractor,
+                      post_processor: PostProcessor, layout_dir: str,
+                      outline_extractor: Optional[OutlineExtractor] = None,
+                      pdf_bytes: Optional[List[Optional[bytes]]] = None) -> List[Dict[str, Any]]:
+    """Processes several PDFs with one batched model call for all of them.
+
+    With an outline_extractor, PDFs whose embedded outline passes its quality
+    check skip layout extraction and the model entirely. Each PDF gets a
+    report: {'pdf', 'path' ('outline', 'model', 'skipped' or 'error'), 'output', 'seconds'},
+    plus 'error' for failed documents and 'metrics' (stage seconds and
+    counters) when utils.metrics is enabled.
+    pdf_bytes, when given, holds the already read content of each PDF.
+    """
+    pdf_bytes = pdf_bytes or [None] * len(pdf_paths)
+    reports = [{'pdf': os.path.basename(p), 'path': 'skipped', 'output': None, 'seconds': 0.0} for p in pdf_paths]
+    doc_metrics = [metrics.document_metrics() for _ in pdf_paths]
+    extracted = [None] * len(pdf_paths)
+    for i, pdf_path in enumerate(pdf_paths):
+        started = time.perf_counter()
+        pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
+        # A document that fails here gets an error report; the rest of the group carries on
+        try:
+            with doc_metrics[i].timer('outline'):
+                final_data = (outline_extractor.extract(pdf_bytes[i] or pdf_path, pdf_name)
+                              if outline_extractor else None)
+            if final_data is not None:
+                reports[i].update(path='outline', output=post_processor.write_output(final_data, doc_metrics[i]))
+                doc_metrics[i].count('headings', len(final_data['headings']))
+                print(f"  - Used embedded outline for: {os.path.basename(pdf_path)}")
+            else:
+                blocks = layout_extractor.extract_and_save_layout(pdf_path, layout_dir, doc_metrics[i],
+                                                                  pdf_bytes[i])
+                if not blocks:
+                    print(f"Could not extract any text blocks from {pdf_path}. Skipping.")
+                extracted[i] = blocks
+        except Exception as e:
+            print(f"[ERROR] Failed to process {os.path.basename(pdf_path)}: {e}")
+            reports[i].update(_error_report(pdf_path, e))
+        reports[i]['seconds'] += time.perf_counter() - started
+
+    model_indices = [i for i, blocks in enumerate(extracted) if blocks]
+    if model_indices:
+        started = time.perf_counter()
+        try:
+            predictions = _predict_documents([extracted[i] for i in model_indices], local_model,
+                                             [doc_metrics[i] for i in model_indices])
+        except Exception as e:
+            # Classify the documents one by one, so only the one that breaks the model call fails
+            print(f"[ERROR] Batched model call failed ({e}); classifying the documents one at a time")
+            predictions = []
+            for i in model_indices:
+                try:
+                    predictions.extend(_predict_documents([extracted[i]], local_model, [doc_metrics[i]]))
+                except Exception as e:
+                    print(f"[ERROR] Failed to classify {os.path.basename(pdf_paths[i])}: {e}")
+                    reports[i].update(_error_report(pdf_paths[i], e))
+                    predictions.append(None)
+        model_seconds = time.perf_counter() - started
+        total_blocks = sum(len(extracted[i]) for i in model_indices)
+
+        for i, doc_predictions in zip(model_indices, predictions):
+            if doc_predictions is None:
+                continue
+            started = time.perf_counter()
+            pdf_name = os.path.splitext(os.path.basename(pdf_paths[i]))[0]
+            if post_processor.process_predictions(extracted[i], doc_predictions, pdf_name, doc_metrics[i]) is None:
+                reports[i].update(path='error', error='post-processing failed')
+            else:
+                reports[i].update(path='model', output=os.path.join(post_processor.output_dir, f"{pdf_name}.json"))
+            # The batched model call is shared out by block count
+            reports[i]['seconds'] += time.perf_counter() - started + model_seconds * len(extracted[i]) / total_blocks
+
+    if metrics.is_enabled():
+        for report, m in zip(reports, doc_metrics):
+            report['metrics'] = m.to_dict()
+    return reports
+
+
+def _predict_documents(stores: List[BlockStore], local_model: LocalHeadingModel, doc_metrics: List) -> List[List[str]]:
+    """Labels for every block of each store, from one batched model call."""
+    # Documents from the page cache only send the pages without reusable predictions to the model
+    contexts = [_prediction_context(store, local_model) if store.cached_pages else None for store in stores]
+    pending = [store.cached_pages.pending(store, context) if context else (store, None)
+               for store, context in zip(stores, contexts)]
+    predictions = local_model.predict_batch([blocks for blocks, _ in pending], doc_metrics=doc_metrics)
+    return [store.cached_pages.merge(context, stale, labels) if context else labels
+            for store, context, (_, stale), labels in zip(stores, contexts, pending, predictions)]
+
+
+def process_pdfs_prefetched(pdf_paths: List[str], local_model: LocalHeadingModel,
+                            layout_extractor: LayoutExtractor, post_processor: PostProcessor, layout_dir: str,
+                            outline_extractor: Optional[OutlineExtractor] = None, batch_size: int = 16,
+                            prefetch: int = 1, reader: Callable[[str], bytes] = read_file
+                            ) -> Iterator[Tuple[List[str], List[Dict[str, Any]]]]:
+    """process_pdf_group over batch_size groups while the next groups are read in the background.
+
+    Yields (group paths, reports) per group in input order. Up to prefetch
+    groups are read ahead of the one being processed (0 reads each PDF when
+    its group is assembled), so slow storage overlaps with extraction and the
+    model instead of stalling them; at most (prefetch + 1) * batch_size PDFs
+    are held in memory.
+    A PDF that cannot be read or fails to process gets an 'error' report;
+    the other PDFs of its group and the remaining groups still run.
+    """
+    prefetcher = PdfPrefetcher(pdf_paths, depth=prefetch * batch_size, reader=reader)
+    group = []
+    for item in prefetcher:
+        group.append(item)
+        if len(group) == batch_size:
+            yield _process_read_group(group, local_model, layout_extractor, post_processor, layout_dir,
+                                      outline_extractor)
+            group = []
+    if group:
+        yield _process_read_group(group, local_model, layout_extractor, post_processor, layout_dir,
+                                  outline_extractor)
+
+
+def _process_read_group(group, local_model, layout_extractor, post_processor, layout_dir,
+                        outline_extractor) -> Tuple[List[str], List[Dict[str, Any]]]:
+    readable = [(path, data) for path, data, error in group if error is None]
+    reports = {}
+    if readable:
+        # process_pdf_group isolates failures per document
+        group_reports = process_pdf_group([path for path, _ in readable], local_model, layout_extractor,
+                                          post_processor, layout_dir, outline_extractor,
+                                          [data for _, data in readable])
+        reports = {path: report for (path, _), report in zip(readable, group_reports)}
+    for path, _, error in group:
+        if error is not None:
+            print(f"[ERROR] Failed to read {os.path.basename(path)}: {error}")
+            reports[path] = _error_report(path, error)
+    paths = [path for path, _, _ in group]
+    return paths, [reports[path] for path in paths]
+
+
+def _error_report(pdf_path: str, error: BaseException) -> Dict[str, Any]:
+    return {'pdf': os.path.basename(pdf_path), 'path': 'error', 'output': None, 'error': str(error)}
+
+
+def _prediction_context(store: BlockStore, local_model: LocalHeadingModel) -> str:
+    """Everything besides a page's own blocks that its predictions depend on, hashed."""
+    prefilter = local_model.prefilter
+    context = (local_model.model_version, sorted(vars(prefilter).items()) if prefilter else None,
+               [float(v) for v in FeatureExtractor.font_statistics(store.font_size)],
+               store.base_font_size if prefilter else None)
+    return hashlib.sha256(repr(context).encode('utf-8')).hexdigest()[:16]
+
+
+def process_pdf_bytes(pdf_bytes: bytes, local_model: LocalHeadingModel, layout_extractor: LayoutExtractor,
+                      post_processor: PostProcessor, pdf_name: str = "document",
+                      outline_extractor: Optional[OutlineExtractor] = None) -> Dict[str, Any]:
+    """Returns the outline dict ({'pdf_name', 'title', 'headings'}) for a PDF held in memory.
+
+    Nothing is read from or written to disk: the bytes are opened with
+    fitz.open(stream=...), and the layout cache, layout JSON and output file
+    are all skipped. Invalid PDFs raise fitz's exception.
+    """
+    final_data = outline_extractor.extract(pdf_bytes, pdf_name) if outline_extractor else None
+    if final_data is not None:
+        return final_data
+    blocks = layout_extractor.extract_layout(pdf_bytes)
+    predictions = local_model.predict(blocks) if len(blocks) else []
+    return post_processor.build_output(blocks, predictions, pdf_name)
+
+
+def process_pdf_streaming(pdf_path: str, local_model: LocalHeadingModel, layout_extractor: LayoutExtractor,
+                          post_processor: PostProcessor, window_pages: int = 50,
+                          outline_extractor: Optional[OutlineExtractor] = None,
+                          spill_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Processes one PDF in page windows so peak memory does not grow with the page count.
+
+    Pass 1 extracts window_pages pages at a time and spills each window to a
+    temporary .npz, keeping only the block font sizes (8 bytes per block) for
+    the document-level statistics. Pass 2 reloads the windows one by one,
+    classifies them with those statistics and keeps only the labelled blocks.
+    Windows end on page boundaries, where neighbour spacing is never shared,
+    so every feature row and therefore every heading matches process_pdf.
+    The layout cache and the debug layout JSON are not used in this mode.
+    """
+    started = time.perf_counter()
+    doc_name = os.path.basename(pdf_path)
+    pdf_name = os.path.splitext(doc_name)[0]
+    report = {'pdf': doc_name, 'path': 'skipped', 'output': None, 'seconds': 0.0}
+    doc_metrics = metrics.document_metrics()
+
+    with doc_metrics.timer('outline'):
+        final_data = outline_extractor.extract(pdf_path, pdf_name) if outline_extractor else None
+    if final_data is not None:
+        report.update(path='outline')
+        print(f"  - Used embedded outline for: {doc_name}")
+    else:
+        print(f"  - Processing document in {window_pages}-page windows: {doc_name}")
+        final_data = _classify_in_windows(pdf_path, local_model, layout_extractor, post_processor, window_pages,
+                                          spill_dir, doc_metrics)
+        if final_data is None:
+            print(f"Could not extract any text blocks from {pdf_path}. Skipping.")
+        else:
+            report.update(path='model')
+
+    if final_data is not None:
+        report['output'] = post_processor.write_output(final_data, doc_metrics)
+        doc_metrics.count('headings', len(final_data['headings']))
+    report['seconds'] = time.perf_counter() - started
+    if metrics.is_enabled():
+        report['metrics'] = doc_metrics.to_dict()
+    return report
+
+
+def _classify_in_windows(pdf_path, local_model, layout_extractor, post_processor, window_pages, spill_dir,
+                         doc_metrics) -> Optional[Dict[str, Any]]:
+    """The two passes of process_pdf_streaming. Returns the outline, or None when the PDF has no text."""
+    font_sizes = array('d')
+    with tempfile.TemporaryDirectory(dir=spill_dir) as spill:
+        window_paths = []
+        windows = layout_extractor.extract_layout_windows(pdf_path, window_pages)
+        while True:
+            with doc_metrics.timer('extract'):
+                window = next(windows, None)
+            if window is None:
+                break
+            doc_metrics.count('pages', len(window.page_sizes))
+            doc_metrics.count('blocks', len(window))
+            if not len(window):
+                continue
+            with doc_metrics.timer('extract'):
+                font_sizes.frombytes(window.font_size.tobytes())
+                window_paths.append(os.path.join(spill, f"window{len(window_paths)}.npz"))
+                window.save(window_paths[-1])
+        if not window_paths:
+            return None
+
+        font_stats = FeatureExtractor.font_statistics(np.frombuffer(font_sizes, dtype=np.float64))
+        labeled_blocks = []
+        for path in window_paths:
+            with doc_metrics.timer('extract'):
+                window = BlockStore.load(path)
+            window.base_font_size = layout_extractor.base_font_size
+            window.font_stats = font_stats
+            predictions = local_model.predict_batch([window], doc_metrics=[doc_metrics])[0]
+            with doc_metrics.timer('postprocess'):
+                labeled_blocks.extend(post_processor.labeled_blocks(window, predictions))
+
+    pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
+    with doc_metrics.timer('postprocess'):
+        final_data = post_processor.build_output_from_labeled(labeled_blocks, pdf_name)
+    return final_data
+
+
+def _init_worker(model_dir: str, output_dir: str, extractor_options: Dict[str, Any], model_options: Dict[str, Any],
+                 outline_options: Optional[Dict[str, Any]], collect_metrics: bool = False,
+                 compact_json: bool = False):
+    metrics.enable(collect_metrics)
+    local_model = LocalHeadingModel(model_dir=model_dir, **model_options)
+    if not local_model.load_model():
+        raise RuntimeError(f"Failed to load the local model from '{model_dir}'")
+    # Parallelism comes from the pool; keep each worker's booster single-threaded
+    if local_model.classifier is not None:
+        local_model.classifier.set_params(n_jobs=1)
+    # Workers write synchronously: the pool already overlaps one worker's I/O with the others' work
+    writer = OutputWriter(compact=compact_json)
+    _worker_state.update(
+        local_model=local_model,
+        layout_extractor=LayoutExtractor(writer=writer, **extractor_options),
+        post_processor=PostProcessor(output_dir=output_dir, writer=writer),
+        outline_extractor=OutlineExtractor(**outline_options) if outline_options is not None else None,
+    )
+
+
+def _process_in_worker(pdf_path: str, layout_dir: str, stream_pages: int = 0) -> Dict[str, Any]:
+    if stream_pages:
+        state = _worker_state
+        return process_pdf_streaming(pdf_path, state['local_model'], state['layout_extractor'],
+                                     state['post_processor'], stream_pages, state['outline_extractor'])
+    return process_pdf(pdf_path, layout_dir=layout_dir, **_worker_state)
+
+
+def _process_bytes_in_worker(pdf_bytes: bytes, pdf_name: str) -> Dict[str, Any]:
+    return process_pdf_bytes(pdf_bytes, pdf_name=pdf_name, **_worker_state)
+
+
+def process_pdfs_parallel(pdf_paths: List[str], output_dir: str, layout_dir: str, workers: int,
+                          model_dir: str = "model", extractor_options: Optional[Dict[str, Any]] = None,
+                          model_options: Optional[Dict[str, Any]] = None,
+                          outline_options: Optional[Dict[str, Any]] = None, stream_pages: int = 0,
+                          compact_json: bool = False) -> Iterator[Tuple[str, Optional[Dict[str, Any]], Optional[BaseException]]]:
+    """Processes PDFs in a process pool, yielding (pdf_path, report, error) in completion order.
+
+    outline_options (OutlineExtractor arguments) turns on the embedded-outline
+    fast path; None leaves it off. stream_pages > 0 processes each PDF with
+    process_pdf_streaming in windows of that many pages.
+
+    Each worker loads the model once. A failing document yields its exception
+    instead of stopping the batch.
+    """
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_dir, output_dir, extractor_options or {},
+                                       model_options or {}, outline_options, metrics.is_enabled(),
+                                       compact_json)) as executor:
+        futures = {executor.submit(_process_in_worker, p, layout_dir, stream_pages): p for p in pdf_paths}
+        for future in as_completed(futures):
+            pdf_path = futures[future]
+            try:
+                yield pdf_path, future.result(), None
+            except Exception as e:
+                yield pdf_path, None, e
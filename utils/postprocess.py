@@ -1,50 +1,84 @@
-import json, os, logging, re
-from typing import List, Dict, Any
+import os, logging, re
+from typing import List, Dict, Any, Optional, Union
 from collections import defaultdict
+from utils.blocks import BlockStore
+from utils.metrics import NULL_METRICS
+from utils.io_pipeline import OutputWriter
+
+# Lone list numbers and bullets that sit in narrow blocks are never headings
+SHORT_TOKEN_RE = re.compile(r'^(\d+[\.\)]?|[-•\u2022\u25AA\u25CF\u2023])$')
 
 class PostProcessor:
-    def __init__(self, output_dir: str = "output"):
+    def __init__(self, output_dir: str = "output", writer: Optional[OutputWriter] = None):
+        # Created on the first write, so in-memory use (build_output only) never touches the disk
         self.output_dir = output_dir
-        os.makedirs(self.output_dir, exist_ok=True)
+        # Synchronous by default; a BackgroundWriter takes writes off the processing thread
+        self.writer = writer or OutputWriter()
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
 
-    def process_predictions(self, blocks: List[Dict[str, Any]], predictions: List[str], pdf_name: str):
+    def process_predictions(self, blocks: Union[BlockStore, List[Dict[str, Any]]], predictions: List[str], pdf_name: str,
+                            doc_metrics=NULL_METRICS) -> Optional[Dict[str, Any]]:
+        """Builds and writes the output JSON. Returns it, or None when post-processing failed."""
         try:
-            cleaned_predictions = []
-            for b, label in zip(blocks, predictions):
-                text = b.get('text', '').strip()
-                width = b['bbox']['x1'] - b['bbox']['x0']
-                is_short_token = re.match(r'^(\d+[\.\)]?|[-•\u2022\u25AA\u25CF\u2023])$', text) is not None
-                if is_short_token and width < 50:
-                    cleaned_predictions.append('NONE')
-                    continue
-                cleaned_predictions.append(label)
-
-            labeled_blocks = [b | {'label': p} for b, p in zip(blocks, cleaned_predictions) if p != 'NONE']
-
-            
-            toc_page_numbers = set()
-            for block in labeled_blocks:
-                if 'table of contents' in block.get('text', '').lower() and block.get('label') in ['H1', 'TITLE']:
-                    toc_page_numbers.add(block['page_number'])
-            if toc_page_numbers: self.logger.info(f"Identified TOC on page(s): {toc_page_numbers}")
-
-            headings = self._extract_headings(labeled_blocks, toc_page_numbers)
-            headings = self._correct_heading_levels(headings) # Apply hierarchy correction
-            clean_headings = self._deduplicate_headings(headings) if headings else []
-            
-            final_data = {
-                'pdf_name': pdf_name,
-                'title': self._extract_title(clean_headings),
-                'headings': self._structure_headings(clean_headings)
-            }
-            
-            output_path = os.path.join(self.output_dir, f"{pdf_name}.json")
-            with open(output_path, 'w', encoding='utf-8') as f: json.dump(final_data, f, indent=2, ensure_ascii=False)
+            with doc_metrics.timer('postprocess'):
+                final_data = self.build_output(blocks, predictions, pdf_name)
+            self.write_output(final_data, doc_metrics)
+            doc_metrics.count('headings', len(final_data['headings']))
             self.logger.info(f"Processed {len(final_data['headings'])} final headings for {pdf_name}")
+            return final_data
         except Exception as e:
             self.logger.error(f"Error processing predictions for {pdf_name}: {e}")
+            return None
+
+    def build_output(self, blocks: Union[BlockStore, List[Dict[str, Any]]], predictions: List[str],
+                     pdf_name: str) -> Dict[str, Any]:
+        """The structured outline for one document, without writing it anywhere."""
+        if not isinstance(blocks, BlockStore):
+            blocks = BlockStore.from_dicts(blocks)
+        return self.build_output_from_labeled(self.labeled_blocks(blocks, predictions), pdf_name)
+
+    def build_output_from_labeled(self, labeled_blocks: List[Dict[str, Any]], pdf_name: str) -> Dict[str, Any]:
+        """build_output from labeled_blocks() results, which can be collected window by window."""
+        toc_page_numbers = set()
+        for block in labeled_blocks:
+            if 'table of contents' in block.get('text', '').lower() and block.get('label') in ['H1', 'TITLE']:
+                toc_page_numbers.add(block['page_number'])
+        if toc_page_numbers: self.logger.debug("Identified TOC on page(s): %s", toc_page_numbers)
+
+        headings = self._extract_headings(labeled_blocks, toc_page_numbers)
+        headings = self._correct_heading_levels(headings) # Apply hierarchy correction
+        clean_headings = self._deduplicate_headings(headings) if headings else []
+
+        return {
+            'pdf_name': pdf_name,
+            'title': self._extract_title(clean_headings),
+            'headings': self._structure_headings(clean_headings)
+        }
+
+    def write_output(self, final_data: Dict[str, Any], doc_metrics=NULL_METRICS) -> str:
+        """Writes the output JSON atomically: readers never see a half-written file.
+
+        With a BackgroundWriter the file may not exist yet when this returns;
+        writer.flush() waits for it, and only then is its 'write' time recorded.
+        """
+        output_path = os.path.join(self.output_dir, f"{final_data['pdf_name']}.json")
+        self.writer.write_json(output_path, final_data, doc_metrics)
+        return output_path
+
+    def labeled_blocks(self, blocks: BlockStore, predictions: List[str]) -> List[Dict[str, Any]]:
+        """Small dicts for the blocks that keep a non-NONE label; body text is never copied."""
+        widths = blocks.width
+        labeled_blocks = []
+        for i, label in enumerate(predictions[:len(blocks)]):
+            if label == 'NONE':
+                continue
+            text = blocks.texts[i]
+            if widths[i] < 50 and SHORT_TOKEN_RE.match(text.strip()):
+                continue
+            labeled_blocks.append({'text': text, 'label': label, 'page_number': int(blocks.page_number[i]),
+                                   'line_position': blocks.y0[i].item()})
+        return labeled_blocks
 
     def _correct_heading_levels(self, headings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Overrides AI predictions based on a strict, hard-coded numbering system."""
@@ -56,7 +90,7 @@ class PostProcessor:
             elif re.match(r'^\d+\.\d+', text): corrected_level = 'H2'
             elif re.match(r'^\d+\.', text): corrected_level = 'H1'
             if corrected_level != original_level and original_level != 'TITLE':
-                self.logger.warning(f"HIERARCHY CORRECTION: Changed '{text}' from {original_level} to {corrected_level}")
+                self.logger.debug("HIERARCHY CORRECTION: Changed '%s' from %s to %s", text, original_level, corrected_level)
                 h['level'] = corrected_level
             corrected_headings.append(h)
         return corrected_headings
@@ -69,10 +103,10 @@ class PostProcessor:
             label, text, page_num = b.get('label'), b.get('text', '').strip(), b.get('page_number')
             if label == 'NONE': continue
             if page_num in toc_page_numbers and 'table of contents' not in text.lower():
-                self.logger.info(f"Filtering TOC entry on page {page_num}: '{text}'")
+                self.logger.debug("Filtering TOC entry on page %s: '%s'", page_num, text)
                 continue
             if text.lower().rstrip(':') in IGNORE_LIST:
-                self.logger.info(f"Filtering out ignored sub-heading: '{text}'")
+                self.logger.debug("Filtering out ignored sub-heading: '%s'", text)
                 continue
             
             headings.append({'text': text, 'level': label, 'page_number': page_num, 'line_position': b['line_position']})
@@ -91,7 +125,7 @@ class PostProcessor:
             if len(occurrences) > 1:
                 positions = [round(occ['y']) for occ in occurrences]
                 if len(set(positions)) < len(positions): common_texts.add(text)
-        if common_texts: self.logger.info(f"Removing potential running headers: {list(common_texts)}")
+        if common_texts: self.logger.debug("Removing potential running headers: %s", list(common_texts))
         return [h for h in headings if h['text'] not in common_texts]
 
     def _extract_title(self, headings: List[Dict[str, Any]]) -> str:
@@ -0,0 +1,40 @@
+import numpy as np
+from typing import Any, Dict, List, Union
+from utils.blocks import BlockStore
+
+
+class BodyTextFilter:
+    """Cheap rules that mark obvious body text as NONE before the classifier runs.
+
+    A block is treated as body text when it is long (at least min_words words
+    and min_chars characters), not bold, and its font is no larger than
+    max_font_ratio times the document's median font size. Everything else
+    still goes through the model. check_prefilter.py measures the heading
+    recall of these thresholds against the model.
+    """
+
+    def __init__(self, min_words: int = 10, min_chars: int = 50, max_font_ratio: float = 1.1,
+                 skip_bold: bool = False):
+        self.min_words = min_words
+        self.min_chars = min_chars
+        self.max_font_ratio = max_font_ratio
+        self.skip_bold = skip_bold
+
+    def body_text_mask(self, blocks: Union[BlockStore, List[Dict[str, Any]]]) -> np.ndarray:
+        """True for blocks that can be labelled NONE without calling the model."""
+        if not isinstance(blocks, BlockStore):
+            blocks = BlockStore.from_dicts(blocks)
+        if not len(blocks):
+            return np.zeros(0, dtype=bool)
+
+        base_font_size = blocks.base_font_size or float(np.median(blocks.font_size))
+        mask = blocks.font_size <= base_font_size * self.max_font_ratio
+        if not self.skip_bold:
+            mask &= ~blocks.is_bold
+
+        texts = blocks.texts
+        for i in np.flatnonzero(mask):
+            text = texts[i]
+            # Length check first: it is cheaper than splitting
+            mask[i] = len(text) >= self.min_chars and len(text.split()) >= self.min_words
+        return mask
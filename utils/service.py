@@ -0,0 +1,105 @@
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+import fitz
+from utils.pipeline import _init_worker, _process_bytes_in_worker
+
+
+class PoolBusy(Exception):
+    """Raised when the pool already holds max_pending requests."""
+
+
+class OutlineWorkerPool:
+    """Warm worker processes, each with its own loaded model, that turn PDF bytes into outline dicts.
+
+    At most max_pending requests are queued or running at once. Beyond that
+    process() raises PoolBusy straight away instead of queueing, so callers
+    (the HTTP server answers 503) back off rather than pile up PDFs in memory.
+    A worker that dies (MuPDF crash, OOM kill) breaks the whole executor; the
+    requests in flight fail and the pool is rebuilt and warmed up again.
+    """
+
+    def __init__(self, workers: int = 1, max_pending: Optional[int] = None, model_dir: str = "model",
+                 extractor_options: Optional[Dict[str, Any]] = None, model_options: Optional[Dict[str, Any]] = None,
+                 outline_options: Optional[Dict[str, Any]] = None):
+        self.workers = workers
+        self.max_pending = max_pending or 2 * workers
+        self.logger = logging.getLogger(__name__)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        # Output files are never written here; the directory is only a PostProcessor argument
+        self._initargs = (model_dir, "output", extractor_options or {}, model_options or {}, outline_options)
+        self._lock = threading.Lock()
+        self._broken = False
+        self._executor = self._new_executor()
+
+    @property
+    def broken(self) -> bool:
+        """True from a worker's death until the rebuilt pool is warm."""
+        return self._broken
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=self._initargs)
+
+    def warm_up(self):
+        """Starts the workers and loads their models now, so the first requests don't pay for it."""
+        self._warm_up(self._executor)
+
+    def _warm_up(self, executor: ProcessPoolExecutor):
+        with fitz.open() as doc:
+            doc.new_page()
+            blank = doc.tobytes()
+        futures = [executor.submit(_process_bytes_in_worker, blank, "warm-up") for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def _rebuild(self):
+        """Replaces the broken executor with a warm one; call with _lock held."""
+        self._broken = True
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = self._new_executor()
+        self._warm_up(self._executor)
+        self._broken = False
+        self.logger.info("Worker pool rebuilt")
+
+    def _current_executor(self) -> ProcessPoolExecutor:
+        # Waits while a rebuild is warming up; retries one that failed
+        with self._lock:
+            if self._broken:
+                self._rebuild()
+            return self._executor
+
+    def _replace(self, executor: ProcessPoolExecutor):
+        with self._lock:
+            # Every request in flight sees the same failure; only the first rebuilds
+            if self._executor is not executor:
+                return
+            self.logger.error("A worker process died; rebuilding the pool")
+            try:
+                self._rebuild()
+            except Exception as e:
+                self.logger.error(f"Failed to rebuild the worker pool: {e}")
+
+    def process(self, pdf_bytes: bytes, pdf_name: str = "document") -> Dict[str, Any]:
+        if not self._slots.acquire(blocking=False):
+            raise PoolBusy(f"{self.max_pending} requests already in progress")
+        try:
+            executor = self._current_executor()
+            try:
+                future = executor.submit(_process_bytes_in_worker, pdf_bytes, pdf_name)
+            except BrokenProcessPool:
+                # The pool broke while idle, so this request never ran: give it to the new one
+                self._replace(executor)
+                executor = self._current_executor()
+                future = executor.submit(_process_bytes_in_worker, pdf_bytes, pdf_name)
+            try:
+                return future.result()
+            except BrokenProcessPool:
+                self._replace(executor)
+                raise
+        finally:
+            self._slots.release()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+from array import array
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from utils.feature_extractor import FeatureExtractor, FEATURE_VERSION
+from utils.layout_cache import file_digest
+
+# Keys that name the document a labelled block came from, in order of preference
+DOCUMENT_KEYS = ('document', 'pdf_name', 'source_file')
+# Documents handed to a worker process per task
+DOCUMENTS_PER_TASK = 32
+
+logger = logging.getLogger(__name__)
+
+
+def iter_training_blocks(path: str) -> Iterator[Dict[str, Any]]:
+    """Labelled blocks of a training file.
+
+    .jsonl files hold one block per line and are read line by line; anything
+    else is the legacy JSON array, which has to be loaded whole.
+    """
+    if path.endswith('.jsonl'):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from json.load(f)
+
+
+def _document_of(block: Dict[str, Any]) -> Any:
+    for key in DOCUMENT_KEYS:
+        if key in block:
+            return block[key]
+    return None
+
+
+def iter_training_documents(path: str) -> Iterator[List[Dict[str, Any]]]:
+    """Runs of consecutive blocks from the same document (see DOCUMENT_KEYS).
+
+    Features are normalised against document-level font statistics, so they
+    must be extracted per document. Blocks without a document key form one
+    group, which is how the legacy single-file training always treated them.
+    """
+    document, blocks = None, []
+    for block in iter_training_blocks(path):
+        key = _document_of(block)
+        if blocks and key != document:
+            yield blocks
+            blocks = []
+        document = key
+        blocks.append(block)
+    if blocks:
+        yield blocks
+
+
+def count_labels(path: str) -> Counter:
+    return Counter(block['label'] for block in iter_training_blocks(path))
+
+
+def _extract_documents(documents: List[List[Dict[str, Any]]]) -> List[Tuple[np.ndarray, List[str]]]:
+    extractor = FeatureExtractor()
+    return [(extractor.extract_features(blocks), [b['label'] for b in blocks]) for blocks in documents]
+
+
+def _batched(items: Iterator, size: int) -> Iterator[List]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _map_documents(documents: Iterator[List[Dict[str, Any]]], n_jobs: int) -> Iterator[Tuple[np.ndarray, List[str]]]:
+    """Per-document (features, labels) in input order.
+
+    With n_jobs > 1 at most 2 x n_jobs tasks are in flight, so reading a large
+    JSONL file never holds more than a few batches of blocks in memory.
+    """
+    batches = _batched(documents, DOCUMENTS_PER_TASK)
+    if n_jobs <= 1:
+        for batch in batches:
+            yield from _extract_documents(batch)
+        return
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        pending = deque()
+        for batch in batches:
+            pending.append(executor.submit(_extract_documents, batch))
+            if len(pending) >= 2 * n_jobs:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def feature_cache_key(path: str) -> str:
+    digest = hashlib.sha256(file_digest(path).encode('ascii'))
+    digest.update(f"features=v{FEATURE_VERSION}:columns={len(FeatureExtractor().get_feature_names())}".encode('ascii'))
+    return digest.hexdigest()
+
+
+def load_training_matrix(path: str, cache_dir: Optional[str] = None,
+                         n_jobs: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """(features, string labels) of a training file, built at most once per file content.
+
+    Rows are appended to a raw float64 file as documents finish, so building
+    the matrix needs memory for one batch of documents, not the corpus. The
+    cached matrix is returned memory-mapped; with cache_dir=None a temporary
+    file is used and the matrix is read into memory.
+    """
+    if cache_dir is None:
+        import tempfile
+        with tempfile.TemporaryDirectory(prefix='features-') as tmp_dir:
+            features, labels = load_training_matrix(path, tmp_dir, n_jobs)
+            return np.array(features), labels
+
+    os.makedirs(cache_dir, exist_ok=True)
+    key = feature_cache_key(path)
+    meta_path = os.path.join(cache_dir, key + '.json')
+    features_path = os.path.join(cache_dir, key + '.features.f8')
+    labels_path = os.path.join(cache_dir, key + '.labels.npy')
+    if os.path.exists(meta_path):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        logger.info(f"Using cached feature matrix {key[:16]} ({meta['rows']} rows)")
+    else:
+        meta = _build_matrix(path, features_path, labels_path, n_jobs)
+        tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        # The metadata file is written last: its presence marks a complete entry
+        os.replace(tmp_path, meta_path)
+
+    if meta['rows'] == 0:
+        return np.empty((0, meta['columns'])), np.array([], dtype=str)
+    features = np.memmap(features_path, dtype=np.float64, mode='r', shape=(meta['rows'], meta['columns']))
+    labels = np.array(meta['labels'])[np.load(labels_path)]
+    return features, labels
+
+
+def _build_matrix(path: str, features_path: str, labels_path: str, n_jobs: int) -> Dict[str, Any]:
+    vocabulary: Dict[str, int] = {}
+    codes = array('H')
+    rows, columns = 0, len(FeatureExtractor().get_feature_names())
+    with open(features_path, 'wb') as f:
+        for features, labels in _map_documents(iter_training_documents(path), n_jobs):
+            if len(features) == 0:
+                continue
+            f.write(np.ascontiguousarray(features, dtype=np.float64).tobytes())
+            rows += len(features)
+            codes.extend(vocabulary.setdefault(label, len(vocabulary)) for label in labels)
+    np.save(labels_path, np.array(codes, dtype=np.uint16))
+    logger.info(f"Extracted features for {rows} training blocks")
+    return {'rows': rows, 'columns': columns, 'labels': list(vocabulary), 'source': os.path.abspath(path)}
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Largest peak resident set size of this process and its finished workers, or None without getrusage."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 1024
@@ -0,0 +1,268 @@
+import json
+import math
+import os
+import numpy as np
+from typing import Any, Dict, List, Optional
+
+# Single-file, memory-mappable inference artifact:
+#   MAGIC | uint64 header length | JSON header | arrays, each 64-byte aligned
+# The header lists every array's dtype, shape and offset, plus the objective,
+# label classes and feature names. Nothing in here imports xgboost or sklearn.
+MAGIC = b'HEADRT01'
+ALIGNMENT = 64
+RUNTIME_FILENAME = 'heading_model.bin'
+
+# Rows evaluated per step; bounds the (rows x trees) working arrays, which are
+# fastest while they stay in cache
+ROW_CHUNK = 256
+
+
+class CompiledHeadingModel:
+    """Pure-NumPy evaluator for an exported XGBoost tree ensemble plus its StandardScaler."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], header: Dict[str, Any]):
+        # Trees grouped by class, keeping their order within a class: each class's
+        # margin is then one sequential sum over a contiguous block of trees
+        order = np.argsort(arrays['tree_class'], kind='stable')
+        self.feature = arrays['node_feature'][order]
+        self.threshold = arrays['node_threshold'][order]
+        self.default_left = arrays['node_default_left'][order].astype(bool)
+        self.leaf_value = arrays['leaf_value'][order]
+        self.tree_class = arrays['tree_class'][order]
+        self.class_bounds = np.searchsorted(self.tree_class, np.arange(len(arrays['base_margin']) + 1))
+        self.base_margin = arrays['base_margin']
+        self.scaler_mean = arrays['scaler_mean']
+        self.scaler_scale = arrays['scaler_scale']
+        self.objective = header['objective']
+        self.num_class = header['num_class']
+        self.depth = header['depth']
+        self.classes = np.array(header['classes'])
+        self.feature_names = header['feature_names']
+
+    # -- export ---------------------------------------------------------------
+
+    @classmethod
+    def export(cls, classifier, scaler, label_encoder, feature_names: Optional[List[str]], path: str,
+               feature_columns: Optional[np.ndarray] = None):
+        """Writes the trained XGBClassifier, scaler and label classes into one artifact.
+
+        A classifier trained on feature_columns only is exported against the
+        full feature vector: split indices are remapped and the unused
+        columns get an identity scaling, so inference needs no column selection.
+        """
+        booster = classifier.get_booster()
+        learner = json.loads(booster.save_raw('json'))['learner']
+        objective = learner['objective']['name']
+        if objective not in ('multi:softprob', 'multi:softmax', 'binary:logistic'):
+            raise ValueError(f"Unsupported objective for export: {objective}")
+        if learner['gradient_booster']['name'] != 'gbtree':
+            raise ValueError("Only gbtree boosters can be exported")
+
+        model = learner['gradient_booster']['model']
+        trees, tree_info = model['trees'], model['tree_info']
+        num_class = max(1, int(learner['learner_model_param']['num_class']))
+        try:
+            best_iteration = classifier.best_iteration
+        except AttributeError:
+            best_iteration = None
+        if best_iteration is not None:
+            # Same trees XGBClassifier.predict uses after early stopping
+            if 'iteration_indptr' in model:
+                trees = trees[:model['iteration_indptr'][best_iteration + 1]]
+            else:
+                # xgboost 1.x dumps have no iteration_indptr: every round adds
+                # num_parallel_tree trees per class, in tree_info order
+                per_round = num_class * int(model['gbtree_model_param'].get('num_parallel_tree', 1))
+                trees = trees[:(best_iteration + 1) * per_round]
+
+        base_score = learner['learner_model_param']['base_score'].strip('[]').split(',')
+        base_score = [float(v) for v in base_score]
+        if len(base_score) == 1:
+            base_score = base_score * num_class
+        if objective == 'binary:logistic':
+            base_score = [math.log(p / (1 - p)) for p in base_score]
+
+        # Every tree is stored as a perfect binary tree of the ensemble's max depth,
+        # so traversal is pure index arithmetic: child = 2 * node + 1 + went_right.
+        # Leaves above the bottom level are padded with splits whose two subtrees
+        # are copies of the same leaf, so the direction taken there is irrelevant.
+        depth = max(cls._tree_depth(t['left_children'], t['right_children']) for t in trees)
+        n_internal, n_leaves = 2 ** depth - 1, 2 ** depth
+        feature = np.zeros((len(trees), n_internal), dtype=np.int32)
+        threshold = np.zeros((len(trees), n_internal), dtype=np.float32)
+        default_left = np.ones((len(trees), n_internal), dtype=np.uint8)
+        leaf_value = np.zeros((len(trees), n_leaves), dtype=np.float32)
+        for t, tree in enumerate(trees):
+            if any(tree['split_type']):
+                raise ValueError("Categorical splits are not supported by the runtime")
+            stack = [(0, 0)]
+            while stack:
+                nid, pos = stack.pop()
+                is_leaf = tree['left_children'][nid] == -1
+                if pos >= n_internal:
+                    leaf_value[t, pos - n_internal] = tree['split_conditions'][nid]
+                    continue
+                if is_leaf:
+                    stack += [(nid, 2 * pos + 1), (nid, 2 * pos + 2)]
+                    continue
+                feature[t, pos] = tree['split_indices'][nid]
+                threshold[t, pos] = tree['split_conditions'][nid]
+                default_left[t, pos] = tree['default_left'][nid]
+                stack += [(tree['left_children'][nid], 2 * pos + 1), (tree['right_children'][nid], 2 * pos + 2)]
+
+        n_features = len(scaler.mean_) if scaler.mean_ is not None else len(scaler.scale_)
+        scaler_mean = np.asarray(scaler.mean_ if scaler.with_mean else np.zeros(n_features), dtype=np.float64)
+        scaler_scale = np.asarray(scaler.scale_ if scaler.with_std else np.ones(n_features), dtype=np.float64)
+        if feature_columns is not None:
+            columns = np.asarray(feature_columns, dtype=np.int32)
+            feature = columns[feature]
+            n_full = len(feature_names) if feature_names else int(columns.max()) + 1
+            full_mean, full_scale = np.zeros(n_full), np.ones(n_full)
+            full_mean[columns], full_scale[columns] = scaler_mean, scaler_scale
+            scaler_mean, scaler_scale = full_mean, full_scale
+        arrays = {
+            'node_feature': feature,
+            'node_threshold': threshold,
+            'node_default_left': default_left,
+            'leaf_value': leaf_value,
+            'tree_class': np.array(tree_info[:len(trees)], dtype=np.int32),
+            'base_margin': np.array(base_score, dtype=np.float32),
+            'scaler_mean': scaler_mean,
+            'scaler_scale': scaler_scale,
+        }
+        header = {
+            'objective': objective,
+            'num_class': num_class,
+            'depth': depth,
+            'classes': [str(c) for c in label_encoder.classes_],
+            'feature_names': feature_names,
+        }
+        cls._write(path, arrays, header)
+
+    @staticmethod
+    def _tree_depth(lefts: List[int], rights: List[int]) -> int:
+        depth, frontier = 0, [0]
+        while frontier:
+            frontier = [c for nid in frontier if lefts[nid] != -1 for c in (lefts[nid], rights[nid])]
+            depth += 1 if frontier else 0
+        return depth
+
+    @staticmethod
+    def _write(path: str, arrays: Dict[str, np.ndarray], header: Dict[str, Any]):
+        def align(n):
+            return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+        layout, offset = {}, 0
+        for name, arr in arrays.items():
+            layout[name] = {'dtype': arr.dtype.str, 'shape': list(arr.shape), 'offset': offset}
+            offset = align(offset + arr.nbytes)
+        header = dict(header, arrays=layout)
+        header_bytes = json.dumps(header).encode('utf-8')
+        data_start = align(len(MAGIC) + 8 + len(header_bytes))
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(len(header_bytes).to_bytes(8, 'little'))
+            f.write(header_bytes)
+            for name, arr in arrays.items():
+                f.seek(data_start + layout[name]['offset'])
+                f.write(np.ascontiguousarray(arr).tobytes())
+        os.replace(tmp_path, path)
+
+    # -- load -----------------------------------------------------------------
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'CompiledHeadingModel':
+        if mmap:
+            buffer = np.memmap(path, dtype=np.uint8, mode='r')
+        else:
+            with open(path, 'rb') as f:
+                buffer = np.frombuffer(f.read(), dtype=np.uint8)
+        if buffer[:len(MAGIC)].tobytes() != MAGIC:
+            raise ValueError(f"{path} is not a heading model runtime artifact")
+        header_len = int.from_bytes(buffer[len(MAGIC):len(MAGIC) + 8].tobytes(), 'little')
+        header_end = len(MAGIC) + 8 + header_len
+        header = json.loads(buffer[len(MAGIC) + 8:header_end].tobytes().decode('utf-8'))
+        data_start = (header_end + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+        arrays = {}
+        for name, spec in header['arrays'].items():
+            dtype = np.dtype(spec['dtype'])
+            count = int(np.prod(spec['shape'], dtype=np.int64))
+            start = data_start + spec['offset']
+            arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=start).reshape(spec['shape'])
+        return cls(arrays, header)
+
+    # -- inference ------------------------------------------------------------
+
+    def scale_inplace(self, features: np.ndarray) -> np.ndarray:
+        """StandardScaler.transform, applied in place."""
+        features -= self.scaler_mean
+        features /= self.scaler_scale
+        return features
+
+    def predict_margin(self, features_scaled: np.ndarray) -> np.ndarray:
+        """Raw margins, accumulated in float32 tree by tree like XGBoost's CPU predictor."""
+        x32 = np.ascontiguousarray(features_scaled, dtype=np.float32)
+        out = np.empty((len(x32), len(self.base_margin)), dtype=np.float32)
+        for start in range(0, len(x32), ROW_CHUNK):
+            chunk = x32[start:start + ROW_CHUNK]
+            leaves = self._leaf_values(chunk)
+            for c, base in enumerate(self.base_margin):
+                # Reducing over axis 0 adds the trees one after another, starting from the base margin
+                out[start:start + len(chunk), c] = np.add.reduce(
+                    leaves[self.class_bounds[c]:self.class_bounds[c + 1]], axis=0, initial=base)
+        return out
+
+    def predict_class_indices(self, features_scaled: np.ndarray) -> np.ndarray:
+        margin = self.predict_margin(features_scaled)
+        if self.objective == 'binary:logistic':
+            # sigmoid(m) > 0.5  <=>  m > 0
+            return (margin[:, 0] > 0).astype(np.int64)
+        return np.argmax(margin, axis=1)
+
+    def _leaf_values(self, x32: np.ndarray) -> np.ndarray:
+        """Walks every tree for every row at once; returns (trees, rows) leaf values.
+
+        node holds global node indices (tree * n_internal + position), so each
+        level is a few gathers into preallocated int32/float32 buffers. Indices
+        are always in range, which lets take() skip its bounds checks.
+        """
+        n_trees, n_internal = self.feature.shape
+        n_rows = len(x32)
+        # Features by row, so a node's values for all rows start at feature * n_rows
+        xt = np.ascontiguousarray(x32.T)
+        flat_xt = xt.ravel()
+        feature_offset = (self.feature.astype(np.int32) * n_rows).ravel()
+        threshold = self.threshold.ravel()
+        rows = np.arange(n_rows, dtype=np.int32)[None, :]
+        tree_offset = (np.arange(n_trees, dtype=np.int32) * n_internal)[:, None]
+        has_missing = bool(np.isnan(x32).any())
+        if self.depth == 0:
+            return np.repeat(self.leaf_value[:, :1], n_rows, axis=1)
+
+        # Level 0: every row is at its tree's root, so the root feature's values are one row of xt
+        fvalue = xt[self.feature[:, 0]]
+        went_right = fvalue >= self.threshold[:, :1]
+        if has_missing:
+            went_right = np.where(np.isnan(fvalue), ~self.default_left[:, :1], went_right)
+        node = tree_offset + 1 + went_right
+        # Child of global node g: 2 * g + 1 - tree_offset (+ 1 when going right)
+        child_base = 1 - tree_offset
+        index, node_threshold = np.empty_like(node), np.empty_like(fvalue)
+        for _ in range(1, self.depth):
+            np.take(feature_offset, node, out=index, mode='clip')
+            index += rows
+            np.take(flat_xt, index, out=fvalue, mode='clip')
+            np.take(threshold, node, out=node_threshold, mode='clip')
+            # Same as ~(fvalue < threshold) except for NaN, which is handled below
+            np.greater_equal(fvalue, node_threshold, out=went_right)
+            if has_missing:
+                went_right = np.where(np.isnan(fvalue), ~np.take(self.default_left.ravel(), node), went_right)
+            node *= 2
+            node += child_base
+            node += went_right
+        # Leaves of tree t are stored at t * (n_internal + 1) + position - n_internal
+        node += (np.arange(n_trees, dtype=np.int32) - n_internal)[:, None]
+        return np.take(self.leaf_value, node, mode='clip')
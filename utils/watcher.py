@@ -0,0 +1,187 @@
+import json
+import logging
+import os
+import signal
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from utils.local_model import LocalHeadingModel
+from utils.layout_utils import LayoutExtractor
+from utils.layout_cache import file_digest
+from utils.postprocess import PostProcessor
+from utils.outline import OutlineExtractor
+from utils.pipeline import process_pdf_group
+from utils.metrics import MetricsSink
+
+MANIFEST_FILENAME = '.manifest.json'
+# Seconds before a failed document is retried; doubles with every further failure, up to the maximum
+RETRY_BACKOFF_SECONDS = 30.0
+MAX_RETRY_BACKOFF_SECONDS = 3600.0
+
+
+class ProcessingManifest:
+    """Record of processed inputs: {file name: {'digest', 'model_version', 'path', 'output', 'processed_at'}}.
+
+    A file is up to date when its content hash and the model version both match
+    its entry and the output it produced still exists. Failed documents also
+    carry 'failures' and 'retry_at': they are retried once retry_at has passed.
+    The manifest is saved atomically after every change, so a crash loses at
+    most the document in flight.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.logger = logging.getLogger(__name__)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Ignoring unreadable manifest {path}: {e}")
+
+    def is_current(self, name: str, digest: str, model_version: str) -> bool:
+        entry = self.entries.get(name)
+        if not entry or entry['digest'] != digest or entry['model_version'] != model_version:
+            return False
+        if entry['path'] == 'error':
+            return time.time() < entry.get('retry_at', 0.0)
+        # Skipped documents (no text) are retried only when the file or the model changes
+        return entry['output'] is None or os.path.exists(entry['output'])
+
+    def record(self, name: str, digest: str, model_version: str, report: Dict[str, Any]):
+        now = time.time()
+        entry = {'digest': digest, 'model_version': model_version, 'path': report['path'],
+                 'output': report['output'], 'processed_at': now}
+        if report['path'] == 'error':
+            previous = self.entries.get(name)
+            failures = 1
+            if previous and previous['path'] == 'error' and previous['digest'] == digest:
+                failures += previous.get('failures', 0)
+            entry.update(failures=failures, retry_at=now + min(MAX_RETRY_BACKOFF_SECONDS,
+                                                               RETRY_BACKOFF_SECONDS * 2 ** (failures - 1)))
+        self.entries[name] = entry
+        self.save()
+
+    def save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class FolderWatcher:
+    """Polls an input directory and processes new or changed PDFs with an already loaded model.
+
+    A file is picked up once its size and modification time are unchanged
+    between two polls (or it is older than settle_seconds), so half-copied
+    files are left alone. SIGTERM and SIGINT stop the loop after the group in
+    flight has been written and recorded.
+    """
+
+    def __init__(self, input_dir: str, local_model: LocalHeadingModel, layout_extractor: LayoutExtractor,
+                 post_processor: PostProcessor, layout_dir: str, manifest_path: Optional[str] = None,
+                 outline_extractor: Optional[OutlineExtractor] = None, poll_interval: float = 2.0,
+                 settle_seconds: float = 2.0, batch_size: int = 16, metrics_sink: Optional[MetricsSink] = None):
+        self.input_dir = input_dir
+        self.local_model = local_model
+        self.layout_extractor = layout_extractor
+        self.post_processor = post_processor
+        self.layout_dir = layout_dir
+        self.outline_extractor = outline_extractor
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.batch_size = batch_size
+        self.metrics_sink = metrics_sink
+        self.manifest = ProcessingManifest(
+            manifest_path or os.path.join(post_processor.output_dir, MANIFEST_FILENAME))
+        # Everything besides the PDF bytes that changes the output
+        self.model_version = (f"{local_model.model_version}:{layout_extractor.cache_key_suffix()}"
+                              f":prefilter={local_model.prefilter is not None}"
+                              f":outline={outline_extractor is not None}")
+        # name -> ((size, mtime_ns), digest or None), refreshed every poll
+        self._seen: Dict[str, Tuple[Tuple[int, int], Optional[str]]] = {}
+        self._stopping = False
+        self.logger = logging.getLogger(__name__)
+
+    def request_stop(self, signum=None, frame=None):
+        if not self._stopping:
+            print("\nStop requested; finishing the documents in flight...")
+        self._stopping = True
+
+    def run(self) -> int:
+        """Watches until stopped. Returns the number of documents processed."""
+        previous = {sig: signal.signal(sig, self.request_stop) for sig in (signal.SIGTERM, signal.SIGINT)}
+        processed = 0
+        try:
+            print(f"Watching {self.input_dir} (model {self.model_version.split(':')[0]}). "
+                  f"Stop with SIGTERM or Ctrl+C.")
+            while not self._stopping:
+                processed += self.run_once()
+                deadline = time.monotonic() + self.poll_interval
+                while not self._stopping and time.monotonic() < deadline:
+                    time.sleep(min(0.2, self.poll_interval))
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+        print(f"Watcher stopped after processing {processed} documents.")
+        return processed
+
+    def run_once(self) -> int:
+        """One poll: processes every settled, out-of-date PDF. Returns how many were processed."""
+        pending = self.scan()
+        processed = 0
+        for start in range(0, len(pending), self.batch_size):
+            if self._stopping:
+                break
+            group = pending[start:start + self.batch_size]
+            reports = self._process_group([os.path.join(self.input_dir, name) for name, _ in group])
+            for (name, digest), report in zip(group, reports):
+                self.manifest.record(name, digest, self.model_version, report)
+                if report['output']:
+                    print(f"Processed {name} ({report['path']}). Results saved to: {report['output']}")
+            if self.metrics_sink is not None:
+                self.metrics_sink.add_all(reports)
+            processed += len(group)
+        return processed
+
+    def _process_group(self, paths: List[str]) -> List[Dict[str, Any]]:
+        """Reports for paths; when the group fails as a whole, each document is retried on its own."""
+        try:
+            return process_pdf_group(paths, self.local_model, self.layout_extractor, self.post_processor,
+                                     self.layout_dir, self.outline_extractor)
+        except Exception as e:
+            if len(paths) == 1:
+                print(f"[ERROR] Failed to process {os.path.basename(paths[0])}: {e}")
+                return [{'pdf': os.path.basename(paths[0]), 'path': 'error', 'output': None, 'error': str(e)}]
+            self.logger.warning(f"Group of {len(paths)} documents failed ({e}); processing them one by one")
+            return [report for path in paths for report in self._process_group([path])]
+
+    def scan(self) -> List[Tuple[str, str]]:
+        """(file name, content digest) of the settled PDFs that are not up to date in the manifest."""
+        now = time.time()
+        seen, pending = {}, []
+        with os.scandir(self.input_dir) as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                if not entry.name.lower().endswith('.pdf'):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    key = (stat.st_size, stat.st_mtime_ns)
+                    previous_key, digest = self._seen.get(entry.name, (None, None))
+                    if key != previous_key:
+                        digest = None
+                    settled = key == previous_key or now - stat.st_mtime >= self.settle_seconds
+                    if settled and digest is None:
+                        # Hash only files that are new or were modified since the last poll
+                        digest = file_digest(entry.path)
+                except OSError as e:
+                    # Removed, renamed or unreadable since the directory was listed; look again next poll
+                    self.logger.warning(f"Skipping {entry.name} this poll: {e}")
+                    continue
+                seen[entry.name] = (key, digest)
+                if settled and not self.manifest.is_current(entry.name, digest, self.model_version):
+                    pending.append((entry.name, digest))
+        self._seen = seen
+        return pending